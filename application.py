@@ -1,8 +1,94 @@
-from flask import Flask, render_template, request
-from pipeline.prediction_pipeline import hybrid_recommendation
+import threading
+import time
+from concurrent import futures
+
+from flask import Flask, jsonify, render_template, request
+from config.paths_config import CONFIG_PATH
+from pipeline.prediction_pipeline import (
+    direct_recommendation_batch,
+    hybrid_recommendation,
+    warm_up,
+)
+from src.logger import get_logger
+from src.recommender_engine import get_engine
+from utils.common import read_yaml
+from utils.micro_batcher import MicroBatcher
+from utils.result_cache import RecommendationCache
+
+logger = get_logger(__name__)
 
 app = Flask(__name__)
 
+config = read_yaml(CONFIG_PATH)
+api_config = config.get("api", {})
+cache_config = config.get("cache", {})
+health_config = config.get("health", {})
+
+# Load every serving artifact once at startup, requests reuse the resident engine
+engine = get_engine()
+
+# Concurrent API requests are scored together in one batched computation
+batcher = MicroBatcher(
+    lambda requests: direct_recommendation_batch(requests, engine=engine),
+    window_ms=api_config.get("batch_window_ms", 5),
+    max_batch_size=api_config.get("max_batch_size", 64),
+)
+
+# Longest wait for the batched results before a request gives up with a 503
+result_timeout = api_config.get("result_timeout_seconds", 10)
+
+# Repeated users are served from the cache until their entry expires or the model changes
+cache = None
+if cache_config.get("enabled", False):
+    cache = RecommendationCache(
+        max_size=cache_config.get("max_size", 10000),
+        ttl=cache_config.get("ttl_seconds", 600),
+    )
+
+
+# /readyz only reports ready once the warm-up queries have run on the loaded engine,
+# /healthz fails when the warm-up never succeeds so the pod is restarted
+ready = threading.Event()
+warm_up_failed = threading.Event()
+
+
+def warm_up_engine():
+    attempts = health_config.get("warmup_attempts", 3)
+
+    for attempt in range(1, attempts + 1):
+        try:
+            succeeded, failed = warm_up(
+                engine,
+                n_queries=health_config.get("warmup_queries", 16),
+                seed=attempt,
+            )
+        except Exception as e:
+            # The memory-mapped artifacts could not be read
+            logger.error(f"Warm-up attempt {attempt} failed: {e}")
+            continue
+
+        if failed:
+            logger.warning(f"{failed} of {succeeded + failed} warm-up queries failed")
+
+        if succeeded:
+            ready.set()
+            logger.info(f"Warm-up done with {succeeded} queries, ready to serve")
+            return
+
+        logger.error(f"Warm-up attempt {attempt} failed: every query failed")
+
+    warm_up_failed.set()
+
+
+threading.Thread(target=warm_up_engine, name="warm-up", daemon=True).start()
+
+
+def parse_n(n):
+    n = int(n)
+    if not 1 <= n <= api_config.get("max_n", 100):
+        raise ValueError(f"n must be between 1 and {api_config.get('max_n', 100)}")
+    return n
+
 
 @app.route("/", methods=["GET", "POST"])
 def home():
@@ -11,12 +97,85 @@ def home():
     if request.method == "POST":
         try:
             user_id = int(request.form["userID"])
-            recommendations = hybrid_recommendation(user_id)
+            recommendations = hybrid_recommendation(user_id, engine=engine, cache=cache)
         except Exception as e:
             print("Error occurred")
 
     return render_template("index.html", recommendations=recommendations)
 
 
+@app.route("/api/recommend", methods=["GET"])
+def api_recommend():
+    try:
+        user_id = int(request.args["user_id"])
+        n = parse_n(request.args.get("n", 10))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+
+    try:
+        recommendations = batcher.submit((user_id, n)).result(timeout=result_timeout)
+    except futures.TimeoutError:
+        return jsonify({"error": "Timed out waiting for the recommendations"}), 503
+
+    if recommendations is None:
+        return jsonify({"error": f"Unknown user: {user_id}"}), 404
+
+    return jsonify({"user_id": user_id, "recommendations": recommendations})
+
+
+@app.route("/api/recommend", methods=["POST"])
+def api_recommend_bulk():
+    # Body: {"user_ids": [...], "n": 10}
+    try:
+        body = request.get_json(force=True)
+        user_ids = [int(user_id) for user_id in body["user_ids"]]
+        n = parse_n(body.get("n", 10))
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+
+    pending = [batcher.submit((user_id, n)) for user_id in user_ids]
+    deadline = time.monotonic() + result_timeout
+
+    results = []
+    for user_id, future in zip(user_ids, pending):
+        try:
+            recommendations = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except futures.TimeoutError:
+            return jsonify({"error": "Timed out waiting for the recommendations"}), 503
+
+        if recommendations is None:
+            results.append({"user_id": user_id, "error": "Unknown user"})
+        else:
+            results.append({"user_id": user_id, "recommendations": recommendations})
+
+    return jsonify({"results": results})
+
+
+@app.route("/api/cache/stats", methods=["GET"])
+def api_cache_stats():
+    if cache is None:
+        return jsonify({"enabled": False})
+
+    return jsonify({"enabled": True, **cache.stats()})
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness: the process is up and serving requests, and its warm-up has not given up
+    if warm_up_failed.is_set():
+        return jsonify({"status": "warm-up failed"}), 503
+
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # Readiness: artifacts loaded and warmed up
+    if not ready.is_set():
+        return jsonify({"ready": False}), 503
+
+    return jsonify({"ready": True, "model_version": engine.model_version})
+
+
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=api_config.get("debug", False), host="0.0.0.0", port=5000)
@@ -0,0 +1,57 @@
+"""
+Benchmark of the user-based stage of hybrid_recommendation: similar users + preference
+aggregation (get_user_recommendations) against direct user -> anime scoring
+(get_direct_recommendations), on the same users of the processed artifacts.
+
+Usage: python benchmarks/direct_scoring_benchmark.py
+"""
+
+import time
+
+import numpy as np
+
+from src.recommender_engine import get_engine
+
+
+def similar_users_stage(engine, user_id):
+    similar_users = engine.find_similar_users(user_id)
+    user_pref = engine.get_user_preferences(user_id)
+    return engine.get_user_recommendations(similar_users, user_pref)
+
+
+def direct_stage(engine, user_id):
+    return engine.get_direct_recommendations(
+        engine.get_user_vector(user_id), engine.get_watched_encoded(user_id)
+    )
+
+
+def time_it(fn, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        fn(user_id)
+    return (time.perf_counter() - start) / len(user_ids)
+
+
+def run(n_queries=50, seed=43):
+    engine = get_engine()
+
+    rng = np.random.default_rng(seed)
+    codes = rng.choice(
+        len(engine.user2user_decoded),
+        min(n_queries, len(engine.user2user_decoded)),
+        replace=False,
+    )
+    user_ids = [engine.user2user_decoded[int(code)] for code in codes]
+
+    similar_users_time = time_it(lambda u: similar_users_stage(engine, u), user_ids)
+    direct_time = time_it(lambda u: direct_stage(engine, u), user_ids)
+
+    print(
+        f"{len(user_ids)} users | similar users stage {similar_users_time * 1e3:8.2f} ms, "
+        f"direct scoring {direct_time * 1e3:8.2f} ms "
+        f"({similar_users_time / direct_time:5.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,80 @@
+"""
+Benchmark of the serving cold start: import time of the prediction pipeline, engine load
+time over the processed artifacts and first query, each measured in a fresh interpreter.
+Also checks that no training-only dependency ends up imported on the serving path.
+
+Usage: python benchmarks/startup_benchmark.py
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRAINING_ONLY = [
+    "tensorflow",
+    "comet_ml",
+    "mlflow",
+    "dvc",
+    "matplotlib",
+    "wordcloud",
+    "google.cloud.storage",
+    "joblib",
+]
+
+COLD_START = """
+import json, sys, time
+
+start = time.perf_counter()
+from pipeline.prediction_pipeline import hybrid_recommendation
+from src.recommender_engine import get_engine
+imported = time.perf_counter()
+
+training_only = [name for name in {training_only!r} if name in sys.modules]
+
+engine = get_engine()
+loaded = time.perf_counter()
+
+hybrid_recommendation(int(engine.user2user_decoded[0]), engine=engine)
+queried = time.perf_counter()
+
+print(json.dumps({{
+    "import": imported - start,
+    "load": loaded - imported,
+    "first_query": queried - loaded,
+    "training_only": training_only,
+}}))
+"""
+
+
+def cold_start():
+    result = subprocess.run(
+        [sys.executable, "-c", COLD_START.format(training_only=TRAINING_ONLY)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(n_runs=5):
+    runs = [cold_start() for _ in range(n_runs)]
+
+    for stage in ["import", "load", "first_query"]:
+        print(
+            f"{stage:12s} median {statistics.median(r[stage] for r in runs) * 1e3:8.1f} ms"
+        )
+
+    total = statistics.median(r["import"] + r["load"] + r["first_query"] for r in runs)
+    print(f"{'total':12s} median {total * 1e3:8.1f} ms over {n_runs} runs")
+
+    imported = sorted({name for r in runs for name in r["training_only"]})
+    print(f"training-only modules imported: {', '.join(imported) or 'none'}")
+
+
+if __name__ == "__main__":
+    run()
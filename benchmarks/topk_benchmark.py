@@ -0,0 +1,56 @@
+"""
+Micro-benchmark of the argpartition top-k kernel against the argsort based selection
+previously used by find_similar_users / find_similar_animes.
+
+Usage: python benchmarks/topk_benchmark.py
+"""
+
+import time
+
+import numpy as np
+
+from utils.similarity import top_k
+
+
+def argsort_top_k(dists, k):
+    # Previous implementation: full sort, then slice the n+1 best
+    return np.argsort(dists)[-k:][::-1]
+
+
+def time_it(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(n_users, embedding_size=128, k=11, repeat=20, batch_size=64, seed=43):
+    rng = np.random.default_rng(seed)
+    weights = rng.standard_normal((n_users, embedding_size)).astype(np.float32)
+    weights /= np.linalg.norm(weights, axis=1, keepdims=True)
+
+    query = int(rng.integers(n_users))
+    dists = np.dot(weights, weights[query])
+
+    # Same neighbours, in the same order, as the argsort selection
+    assert np.array_equal(argsort_top_k(dists, k), top_k(dists, k))
+
+    argsort_time = time_it(lambda: argsort_top_k(dists, k), repeat)
+    top_k_time = time_it(lambda: top_k(dists, k), repeat)
+
+    queries = rng.integers(n_users, size=batch_size)
+    batch_dists = np.dot(weights[queries], weights.T)
+    loop_time = time_it(lambda: [argsort_top_k(row, k) for row in batch_dists], 3)
+    batch_time = time_it(lambda: top_k(batch_dists, k), 3)
+
+    print(
+        f"users={n_users:>9,} | single query: argsort {argsort_time * 1e3:8.3f} ms, "
+        f"top_k {top_k_time * 1e3:8.3f} ms ({argsort_time / top_k_time:5.1f}x) | "
+        f"batch of {batch_size}: argsort loop {loop_time * 1e3:9.2f} ms, "
+        f"top_k {batch_time * 1e3:8.2f} ms ({loop_time / batch_time:5.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    for n_users in (100_000, 500_000, 1_000_000):
+        run(n_users)
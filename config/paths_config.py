@@ -10,25 +10,62 @@ ANIMELIST_CSV = "artifacts/raw/animelist.csv"
 ANIME_CSV = "artifacts/raw/anime.csv"
 ANIME_SYNOPSIS_CSV = "artifacts/raw/anime_with_synopsis.csv"
 
-X_TRAIN_ARRAY = os.path.join(PROCESSED_DIR, "X_train_array.pkl")
-X_TEST_ARRAY = os.path.join(PROCESSED_DIR, "X_test_array.pkl")
-Y_TRAIN = os.path.join(PROCESSED_DIR, "y_train.pkl")
-Y_TEST = os.path.join(PROCESSED_DIR, "y_test.pkl")
+# Typed .npy arrays listed in the manifest, memory-mapped by training and serving
+PROCESSED_MANIFEST = os.path.join(PROCESSED_DIR, "manifest.json")
 
+X_TRAIN_USER = os.path.join(PROCESSED_DIR, "X_train_user.npy")
+X_TRAIN_ANIME = os.path.join(PROCESSED_DIR, "X_train_anime.npy")
+X_TEST_USER = os.path.join(PROCESSED_DIR, "X_test_user.npy")
+X_TEST_ANIME = os.path.join(PROCESSED_DIR, "X_test_anime.npy")
+Y_TRAIN = os.path.join(PROCESSED_DIR, "y_train.npy")
+Y_TEST = os.path.join(PROCESSED_DIR, "y_test.npy")
+
+# One .npy file per rating_df column
+RATING_DF_DIR = os.path.join(PROCESSED_DIR, "rating_df")
+
+# Legacy csv rating_df, only read when the rating index is missing
 RATING_DF = os.path.join(PROCESSED_DIR, "rating_df.csv")
 ANIME_DF = os.path.join(PROCESSED_DIR, "anime_df.csv")
 SYNOPSIS_DF = os.path.join(PROCESSED_DIR, "synopsis_df.csv")
 
+# Per-user rating index (CSR layout)
+RATING_INDEX_OFFSETS = os.path.join(PROCESSED_DIR, "rating_index_offsets.npy")
+RATING_INDEX_ANIME = os.path.join(PROCESSED_DIR, "rating_index_anime.npy")
+RATING_INDEX_RATING = os.path.join(PROCESSED_DIR, "rating_index_rating.npy")
+
 USER2USER_ENCODED = os.path.join(PROCESSED_DIR, "user2user_encoded.pkl")
 USER2USER_DECODED = os.path.join(PROCESSED_DIR, "user2user_decoded.pkl")
 
 ANIME2ANIME_ENCODED = os.path.join(PROCESSED_DIR, "anim2anime_encoded.pkl")
 ANIME2ANIME_DECODED = os.path.join(PROCESSED_DIR, "anim2anime_decoded.pkl")
 
+# Array encoders (code -> id), the dict artifacts above are kept for compatibility
+USER_IDS = os.path.join(PROCESSED_DIR, "user_ids.npy")
+ANIME_IDS = os.path.join(PROCESSED_DIR, "anime_ids.npy")
+
 # Model training
 MODEL_DIR = "artifacts/model"
 WEIGHTS_DIR = "artifacts/weights"
 MODEL_PATH = os.path.join(MODEL_DIR, "model.h5")
 ANIME_WEIGHTS_PATH = os.path.join(WEIGHTS_DIR, "anime_weights.pkl")
 USER_WEIGHTS_PATH = os.path.join(WEIGHTS_DIR, "user_weights.pkl")
+
+# Raw .npy weights, memory-mapped read-only so serving workers share one page-cache copy
+ANIME_WEIGHTS_NPY = os.path.join(WEIGHTS_DIR, "anime_weights.npy")
+USER_WEIGHTS_NPY = os.path.join(WEIGHTS_DIR, "user_weights.npy")
+ANIME_WEIGHTS_F16_NPY = os.path.join(WEIGHTS_DIR, "anime_weights_f16.npy")
+USER_WEIGHTS_F16_NPY = os.path.join(WEIGHTS_DIR, "user_weights_f16.npy")
+
+USER_ANN_INDEX_DIR = os.path.join(WEIGHTS_DIR, "user_ann_index")
+ANIME_ANN_INDEX_DIR = os.path.join(WEIGHTS_DIR, "anime_ann_index")
+ANIME_NEIGHBOUR_IDS = os.path.join(WEIGHTS_DIR, "anime_neighbour_ids.npy")
+ANIME_NEIGHBOUR_SCORES = os.path.join(WEIGHTS_DIR, "anime_neighbour_scores.npy")
+ANIME_NEIGHBOUR_META = os.path.join(WEIGHTS_DIR, "anime_neighbour_meta.json")
 CHECKPOINT_FILE_PATH = "artifacts/model_checkpoint/weights.weights.h5"
+
+# Batch scoring, precomputed recommendations of every known user (one row per encoded user)
+RECOMMENDATIONS_DIR = "artifacts/recommendations"
+BATCH_RECOMMENDATIONS = os.path.join(RECOMMENDATIONS_DIR, "user_recommendations.npy")
+BATCH_RECOMMENDATIONS_META = os.path.join(
+    RECOMMENDATIONS_DIR, "user_recommendations.json"
+)
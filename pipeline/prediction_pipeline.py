@@ -1,50 +1,206 @@
-from config.paths_config import *
-from utils.helpers import *
+import numpy as np
 
+from src.recommender_engine import get_engine
+from utils.fusion import ScoreSignal, fuse_scores
 
-def hybrid_recommendation(user_id, user_weight=0.5, content_weight=0.5):
-    # User recommendation
-    similar_users = find_similar_users(
-        user_id, USER_WEIGHTS_PATH, USER2USER_ENCODED, USER2USER_DECODED
-    )
 
-    user_pref = get_user_preferences(user_id, RATING_DF, ANIME_DF)
-    user_recommended_animes = get_user_recommendations(
-        similar_users, user_pref, ANIME_DF, SYNOPSIS_DF, RATING_DF
+def hybrid_recommendation(
+    user_id,
+    user_weight=0.5,
+    content_weight=0.5,
+    engine=None,
+    ratings=None,
+    user_scorer="similar_users",
+    n=10,
+    cache=None,
+):
+    # Reuse the process-wide engine so artifacts are not reloaded per request
+    if engine is None:
+        engine = get_engine()
+
+    args = (user_id, user_weight, content_weight, engine, ratings, user_scorer, n)
+
+    if ratings is None:
+        # O(1) lookup of the batch scoring results, when they match the model and request
+        anime_ids = engine.get_precomputed_recommendations(
+            user_id, n, user_weight, content_weight, user_scorer
+        )
+        if anime_ids is not None:
+            return engine.get_anime_names(anime_ids)
+
+    # Fold-in requests depend on the given ratings and are not cached
+    if cache is None or ratings is not None:
+        return engine.get_anime_names(hybrid_anime_ids(*args))
+
+    return cache.get_or_compute(
+        (user_id, user_weight, content_weight, user_scorer, n),
+        engine.model_version,
+        lambda: engine.get_anime_names(hybrid_anime_ids(*args)),
     )
 
-    # Get the list of names of recommended animes
-    user_recommended_anime_list = user_recommended_animes["anime_name"].tolist()
 
-    # Content-based recommendation
-    content_recommended_animes = []
+def hybrid_anime_ids(
+    user_id, user_weight, content_weight, engine, ratings, user_scorer, n
+):
+    """Ids of the animes hybrid_recommendation recommends, best first, computed live."""
+
+    # Users unknown to the model are folded in from their {anime id: rating}
+    fold_in = ratings is not None and engine.user2user_encoded.get(user_id) is None
+    if fold_in:
+        encoded_watched = engine.encode_anime_ids(list(ratings))
+    else:
+        encoded_watched = engine.get_watched_encoded(user_id)
+
+    # User recommendation
+    if user_scorer == "direct":
+        # Score every anime against the user vector in one pass
+        if fold_in:
+            user_vector = engine.fold_in_user(ratings)
+        else:
+            user_vector = engine.get_user_vector(user_id)
 
-    for anime in user_recommended_anime_list:
-        similar_animes = find_similar_animes(
-            anime,
-            ANIME_WEIGHTS_PATH,
-            ANIME2ANIME_ENCODED,
-            ANIME2ANIME_DECODED,
-            ANIME_DF,
+        user_recommended_animes = engine.get_direct_recommendations(
+            user_vector, encoded_watched
         )
+    else:
+        if fold_in:
+            user_vector = engine.fold_in_user(ratings)
+            similar_users = engine.find_similar_users_to_vector(user_vector)
 
-        if similar_animes is not None and not similar_animes.empty:
-            content_recommended_animes.extend(similar_animes["name"].tolist())
+            user_pref = engine.get_preferences_from_ratings(ratings)
         else:
+            similar_users = engine.find_similar_users(user_id)
+
+            user_pref = engine.get_user_preferences(user_id)
+
+        user_recommended_animes = engine.get_user_recommendations(
+            similar_users, user_pref
+        )
+
+    # Get the list of names of recommended animes
+    user_recommended_anime_list = user_recommended_animes["anime_name"].tolist()
+
+    # Collaborative scores: similar user counts, or the direct user -> anime scores
+    user_scores = user_recommended_animes[
+        "score" if user_scorer == "direct" else "n"
+    ].to_numpy()
+
+    user_recommended_encoded = engine.encode_anime_names(user_recommended_anime_list)
+    resolved = user_recommended_encoded >= 0
+
+    for anime, found in zip(user_recommended_anime_list, resolved):
+        if not found:
             print(f"No similar anime found {anime}")
 
-    # Combine the scores of the user-based and content-based recommendations
-    combined_scores = {}
+    # Content-based scores: similarities of the animes similar to every recommended anime
+    content_animes, content_similarities = engine.get_similar_anime_scores(
+        user_recommended_encoded[resolved]
+    )
+
+    # Fuse the normalized signals over the encoded anime space, the weights set the
+    # importance of each recommendation type
+    signals = [
+        ScoreSignal(
+            user_scores[resolved],
+            indices=user_recommended_encoded[resolved],
+            weight=user_weight,
+        ),
+        ScoreSignal(
+            content_similarities, indices=content_animes, weight=content_weight
+        ),
+    ]
+
+    # Watched animes and animes without metadata are never recommended
+    excluded = np.union1d(
+        encoded_watched, np.flatnonzero(engine.anime_without_metadata)
+    )
+
+    best, _ = fuse_scores(signals, len(engine.anime_ids), n, exclude=excluded)
+
+    return engine.anime_ids[best]
+
+
+def direct_recommendation_batch(requests, engine=None):
+    """
+    Direct user -> anime recommendations for several (user_id, n) requests at once,
+    scored with one batched matrix product.
+
+    Returns:
+        A list aligned with requests of json serializable recommendation lists,
+        None for users unknown to the model
+    """
+
+    if engine is None:
+        engine = get_engine()
+
+    user_ids = [user_id for user_id, _ in requests]
+    max_n = max(n for _, n in requests)
+
+    results = []
+    for frame, (_, n) in zip(
+        engine.get_direct_recommendations_batch(user_ids, n=max_n), requests
+    ):
+        if frame is None:
+            results.append(None)
+            continue
+
+        results.append(
+            [
+                {
+                    "anime_id": int(anime["anime_id"]),
+                    "name": anime["anime_name"],
+                    "genres": (
+                        anime["Genres"] if isinstance(anime["Genres"], str) else None
+                    ),
+                    "score": float(anime["score"]),
+                }
+                for anime in frame.head(n).to_dict("records")
+            ]
+        )
+
+    return results
+
+
+def warm_up(engine=None, n_queries=16, seed=0):
+    """
+    Run synthetic queries through the serving paths before the process receives traffic.
+
+    Pages in the memory-mapped artifacts and pays the first call costs (BLAS, pandas)
+    of the similar users, direct and batched scoring paths. Results are discarded, the
+    precomputed recommendations and the result cache are bypassed. A failing query (e.g.
+    a recommended anime without a synopsis) is counted and does not stop the warm-up.
+
+    Returns:
+        The numbers of queries that succeeded and failed
+    """
+
+    if engine is None:
+        engine = get_engine()
+
+    engine.touch_memory_maps()
+
+    n_users = len(engine.user2user_decoded)
+    rng = np.random.default_rng(seed)
+    codes = rng.choice(n_users, min(n_queries, n_users), replace=False)
+    user_ids = [int(engine.user2user_decoded[int(code)]) for code in codes]
 
-    # Collect all anime recommendations from both user-based and content-based recommendations assigning weights to each
-    # Changing the weights will change the importance of each recommendation type (as they get sorted by score)
-    for anime in user_recommended_anime_list:
-        combined_scores[anime] = combined_scores.get(anime, 0) + user_weight
+    succeeded = failed = 0
 
-    for anime in content_recommended_animes:
-        combined_scores[anime] = combined_scores.get(anime, 0) + content_weight
+    for user_id in user_ids:
+        for user_scorer in ("similar_users", "direct"):
+            try:
+                engine.get_anime_names(
+                    hybrid_anime_ids(user_id, 0.5, 0.5, engine, None, user_scorer, 10)
+                )
+                succeeded += 1
+            except Exception:
+                failed += 1
 
-    # print(combined_scores.items()[0][1]) -> score
-    sorted_animes = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
+    if user_ids:
+        try:
+            direct_recommendation_batch([(user_id, 10) for user_id in user_ids], engine)
+            succeeded += 1
+        except Exception:
+            failed += 1
 
-    return [anime for anime, score in sorted_animes[:10]]
+    return succeeded, failed
@@ -1,5 +1,6 @@
 from src.data_processor import DataProcessor
 from src.model_trainer import ModelTrainer
+from src.index_builder import IndexBuilder
 from config.paths_config import *
 
 '''
@@ -15,3 +16,7 @@ if __name__ == "__main__":
 
     model_trainer = ModelTrainer(PROCESSED_DIR)
     model_trainer.train()
+
+    # ANN indexes over the saved user and anime weights
+    index_builder = IndexBuilder(CONFIG_PATH)
+    index_builder.run()
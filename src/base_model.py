@@ -11,6 +11,7 @@ from tensorflow.keras.layers import (
 
 from src.logger import get_logger
 from src.custom_exception import CustomException
+from src.optimizers import get_optimizer
 from utils.common import read_yaml
 
 logger = get_logger(__name__)
@@ -27,6 +28,7 @@ class BaseModel:
     def RecommenderNet(self, n_users, n_anime):
         try:
             embedding_size = self.config["model"]["embedding_size"]
+            performance = self.config.get("training", {}).get("performance", {})
 
             # User embedding layer
             user = Input(name="user", shape=[1])
@@ -54,8 +56,8 @@ class BaseModel:
             # Batch normalization
             x = BatchNormalization()(x)
 
-            # Activation function
-            x = Activation("sigmoid")(x)
+            # Activation function, kept in float32 under a mixed precision policy for a stable loss
+            x = Activation("sigmoid", dtype="float32")(x)
 
             # The input was separated into user and anime for this purpose
             model = Model(inputs=[user, anime], outputs=x)
@@ -63,8 +65,9 @@ class BaseModel:
             # Compile the model
             model.compile(
                 loss=self.config["model"]["loss"],
-                optimizer=self.config["model"]["optimizer"],
+                optimizer=get_optimizer(self.config["model"]["optimizer"]),
                 metrics=self.config["model"]["metrics"],
+                jit_compile=performance.get("jit_compile", False),
             )
 
             logger.info("Model created successfully")
@@ -8,16 +8,27 @@ import joblib
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from config.paths_config import *
+from utils.artifact_store import load_arrays, read_manifest, save_arrays
+from utils.common import read_yaml
+from utils.id_encoder import IdEncoder
+from utils.rating_index import RatingIndex
 
 logger = get_logger(__name__)
 
+# Narrow dtypes for the raw ratings columns read by the streaming mode
+RATING_DTYPES = {"user_id": np.int32, "anime_id": np.int32, "rating": np.uint8}
+
 
 class DataProcessor:
-    def __init__(self, input_file, output_dir):
+    def __init__(self, input_file, output_dir, config_path=CONFIG_PATH):
         self.input_file = input_file
         self.output_dir = output_dir
+        config = read_yaml(config_path)
+        self.config = config.get("data_processing", {})
+        self.incremental = config.get("incremental", {}).get("enabled", False)
 
         self.rating_df = None
+        self.rating_columns = None
         self.anime_df = None
         self.X_train_array = None
         self.X_test_array = None
@@ -28,6 +39,11 @@ class DataProcessor:
         self.user2user_decoded = {}
         self.anime2anime_encoded = {}
         self.anime2anime_decoded = {}
+        self.user_encoder = None
+        self.anime_encoder = None
+        self.rating_range = None
+        self.previous_n_users = None
+        self.previous_n_anime = None
 
         os.makedirs(self.output_dir, exist_ok=True)
         logger.info("Data processing started")
@@ -54,54 +70,343 @@ class DataProcessor:
         except Exception as e:
             raise CustomException("Failed to filter data", sys)
 
-    def scale_ratings(self):
+    def count_user_ratings(self, usecols, chunk_size):
+        # Streaming pass one: number of ratings and rating range of every user, chunk by chunk
+        user_stats = None
+
+        for chunk in pd.read_csv(
+            self.input_file,
+            usecols=usecols,
+            dtype=RATING_DTYPES,
+            chunksize=chunk_size,
+        ):
+            chunk_stats = chunk.groupby("user_id")["rating"].agg(["size", "min", "max"])
+
+            if user_stats is not None:
+                chunk_stats = (
+                    pd.concat([user_stats, chunk_stats])
+                    .groupby(level=0)
+                    .agg({"size": "sum", "min": "min", "max": "max"})
+                )
+            user_stats = chunk_stats
+
+        return user_stats
+
+    def process_ratings_streaming(
+        self, usecols, min_rating=400, chunk_size=1_000_000, random_state=None
+    ):
+        """
+        Bounded-memory equivalent of load_data, filter_users, scale_ratings and encode_data,
+        and of the split_data shuffle when random_state is given.
+
+        Pass one counts ratings per user. Pass two filters, scales and encodes every chunk
+        and writes it straight into the memory-mapped rating_df column files (int32 ids and
+        codes, float32 ratings), at the rows the split_data shuffle moves it to. Besides one
+        parsed chunk, only the 4 byte per rating destination of the shuffle is held in
+        memory. The columns are left in rating_columns, rating_df is not built.
+        """
+
         try:
-            # Min max scaling of ratings
-            min_rating = min(self.rating_df["rating"])
-            max_rating = max(self.rating_df["rating"])
-
-            self.rating_df["rating"] = (
-                self.rating_df["rating"]
-                .apply(lambda x: (x - min_rating) / (max_rating - min_rating))
-                .values.astype(np.float64)
+            user_stats = self.count_user_ratings(usecols, chunk_size)
+            kept_stats = user_stats[user_stats["size"] >= min_rating]
+            kept_users = kept_stats.index.to_numpy()
+
+            min_value = np.float32(kept_stats["min"].min())
+            max_value = np.float32(kept_stats["max"].max())
+            n_rows = int(kept_stats["size"].sum())
+            self.rating_range = (min_value, max_value)
+
+            logger.info(
+                f"Streaming pass one done: {len(kept_users)} users with {n_rows} ratings kept"
             )
 
+            destination = None
+            if random_state is not None:
+                # Row i goes where DataFrame.sample(frac=1, random_state) moves it
+                permutation = np.random.RandomState(random_state).permutation(n_rows)
+                index_dtype = np.int32 if n_rows < 2**31 else np.int64
+                destination = np.empty(n_rows, dtype=index_dtype)
+                destination[permutation] = np.arange(n_rows, dtype=index_dtype)
+                del permutation
+
+            os.makedirs(RATING_DF_DIR, exist_ok=True)
+            columns = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(RATING_DF_DIR, f"{name}.npy"),
+                    mode="w+",
+                    dtype=dtype,
+                    shape=(n_rows,),
+                )
+                for name, dtype in (
+                    ("user_id", np.int32),
+                    ("anime_id", np.int32),
+                    ("rating", np.float32),
+                    ("user", np.int32),
+                    ("anime", np.int32),
+                )
+            }
+
+            # Ids in order of first appearance, the same codes encode_data assigns
+            user_ids = pd.Index([], dtype=np.int32)
+            anime_ids = pd.Index([], dtype=np.int32)
+
+            position = 0
+            for chunk in pd.read_csv(
+                self.input_file,
+                usecols=usecols,
+                dtype=RATING_DTYPES,
+                chunksize=chunk_size,
+            ):
+                chunk = chunk[chunk["user_id"].isin(kept_users)]
+                end = position + len(chunk)
+
+                if destination is None:
+                    rows = slice(position, end)
+                else:
+                    rows = destination[position:end]
+
+                user_ids = user_ids.append(
+                    pd.Index(chunk["user_id"].unique()).difference(user_ids, sort=False)
+                )
+                anime_ids = anime_ids.append(
+                    pd.Index(chunk["anime_id"].unique()).difference(
+                        anime_ids, sort=False
+                    )
+                )
+
+                rating = chunk["rating"].to_numpy(dtype=np.float32)
+                rating -= min_value
+                rating /= max_value - min_value
+
+                columns["user_id"][rows] = chunk["user_id"].to_numpy()
+                columns["anime_id"][rows] = chunk["anime_id"].to_numpy()
+                columns["rating"][rows] = rating
+                columns["user"][rows] = user_ids.get_indexer(chunk["user_id"])
+                columns["anime"][rows] = anime_ids.get_indexer(chunk["anime_id"])
+
+                position = end
+
+            for column in columns.values():
+                column.flush()
+            self.rating_columns = {
+                name: columns[name] for name in usecols + ["user", "anime"]
+            }
+
+            self.set_encoders(
+                IdEncoder(user_ids.to_numpy()), IdEncoder(anime_ids.to_numpy())
+            )
+
+            logger.info("Ratings streamed, filtered, scaled and encoded successfully")
+        except Exception as e:
+            raise CustomException("Failed to stream ratings data", sys)
+
+    def split_streamed(self, test_size=1000, chunk_size=1_000_000):
+        # split_data of the streamed ratings, which are already shuffled: the train and test
+        # rows are copied block by block into their own memory-mapped files
+        try:
+            n_rows = len(self.rating_columns["rating"])
+            train_indices = n_rows - test_size
+
+            splits = {}
+            for path, column, start, end in (
+                (X_TRAIN_USER, "user", 0, train_indices),
+                (X_TRAIN_ANIME, "anime", 0, train_indices),
+                (X_TEST_USER, "user", train_indices, n_rows),
+                (X_TEST_ANIME, "anime", train_indices, n_rows),
+                (Y_TRAIN, "rating", 0, train_indices),
+                (Y_TEST, "rating", train_indices, n_rows),
+            ):
+                values = self.rating_columns[column]
+                split = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=values.dtype, shape=(end - start,)
+                )
+                for block in range(start, end, chunk_size):
+                    block_end = min(block + chunk_size, end)
+                    split[block - start : block_end - start] = values[block:block_end]
+
+                split.flush()
+                splits[path] = split
+
+            self.X_train_array = [splits[X_TRAIN_USER], splits[X_TRAIN_ANIME]]
+            self.X_test_array = [splits[X_TEST_USER], splits[X_TEST_ANIME]]
+            self.y_train = splits[Y_TRAIN]
+            self.y_test = splits[Y_TEST]
+
+            logger.info("Streamed data split successfully")
+        except Exception as e:
+            raise CustomException("Failed to split streamed data", sys)
+
+    def scale_ratings(self):
+        try:
+            # Min max scaling of ratings, in place on a float32 copy of the column
+            rating = self.rating_df["rating"].to_numpy(dtype=np.float32, copy=True)
+            min_rating = rating.min()
+            max_rating = rating.max()
+            self.rating_range = (min_rating, max_rating)
+
+            rating -= min_rating
+            rating /= max_rating - min_rating
+            self.rating_df["rating"] = rating
+
             logger.info("Ratings scaled successfully")
         except Exception as e:
             raise CustomException("Failed to scale data", sys)
 
+    def set_encoders(self, user_encoder, anime_encoder):
+        self.user_encoder = user_encoder
+        self.anime_encoder = anime_encoder
+
+        self.user2user_encoded = dict(
+            zip(self.user_encoder.ids.tolist(), range(len(self.user_encoder)))
+        )
+        self.user2user_decoded = dict(enumerate(self.user_encoder.ids.tolist()))
+        self.anime2anime_encoded = dict(
+            zip(self.anime_encoder.ids.tolist(), range(len(self.anime_encoder)))
+        )
+        self.anime2anime_decoded = dict(enumerate(self.anime_encoder.ids.tolist()))
+
     def encode_data(self):
         try:
-            # Users encoding
-            user_ids = self.rating_df["user_id"].unique().tolist()
-            self.user2user_encoded = {x: i for i, x in enumerate(user_ids)}
-            self.user2user_decoded = {i: x for i, x in enumerate(user_ids)}
-            self.rating_df["user"] = self.rating_df["user_id"].map(
-                self.user2user_encoded
+            # Users and Anime encoding, codes follow the order of first appearance
+            user_encoder, self.rating_df["user"] = IdEncoder.fit(
+                self.rating_df["user_id"]
             )
-
-            # Anime encoding
-            anime_ids = self.rating_df["anime_id"].unique().tolist()
-            self.anime2anime_encoded = {x: i for i, x in enumerate(anime_ids)}
-            self.anime2anime_decoded = {i: x for i, x in enumerate(anime_ids)}
-            self.rating_df["anime"] = self.rating_df["anime_id"].map(
-                self.anime2anime_encoded
+            anime_encoder, self.rating_df["anime"] = IdEncoder.fit(
+                self.rating_df["anime_id"]
             )
+            self.set_encoders(user_encoder, anime_encoder)
 
             logger.info("Users and Anime encoded successfully")
         except Exception as e:
             raise CustomException("Failed to encode data", sys)
 
-    def split_data(self, test_size=1000, random_state=43):
+    def load_previous_artifacts(self):
+        """Encodings, rating range and ratings of the last run, None without a last run."""
+
+        if not os.path.exists(PROCESSED_MANIFEST):
+            return None
+
+        try:
+            metadata = read_manifest(PROCESSED_MANIFEST)["metadata"]
+            arrays = load_arrays(
+                PROCESSED_MANIFEST,
+                names=[
+                    "user_ids",
+                    "anime_ids",
+                    "rating_df/user_id",
+                    "rating_df/anime_id",
+                    "rating_df/rating",
+                ],
+                mmap_mode=None,
+            )
+            arrays["rating_range"] = (
+                np.float32(metadata["rating_min"]),
+                np.float32(metadata["rating_max"]),
+            )
+
+            return arrays
+        except Exception as e:
+            raise CustomException("Failed to load previous artifacts", sys)
+
+    def apply_rating_range(self, rating_range):
+        # Rescale ratings from self.rating_range to rating_range, so old and new ratings match
+        try:
+            if tuple(rating_range) != tuple(self.rating_range):
+                min_rating, max_rating = self.rating_range
+                rating = self.rating_df["rating"].to_numpy(dtype=np.float32, copy=True)
+
+                rating *= max_rating - min_rating
+                rating += min_rating - rating_range[0]
+                rating /= rating_range[1] - rating_range[0]
+                self.rating_df["rating"] = rating
+
+            self.rating_range = rating_range
+        except Exception as e:
+            raise CustomException("Failed to rescale data", sys)
+
+    def extend_encoding(self, previous):
+        """
+        Encode users and animes with the codes of the last run, so its embeddings stay valid.
+
+        Ids seen for the first time get the next codes, in order of first appearance.
+        """
+
+        try:
+            encoders = []
+            for column, code_column, ids_name in (
+                ("user_id", "user", "user_ids"),
+                ("anime_id", "anime", "anime_ids"),
+            ):
+                previous_ids = previous[ids_name]
+                values = self.rating_df[column].to_numpy()
+
+                new_ids = pd.unique(values[IdEncoder(previous_ids).encode(values) < 0])
+                encoder = IdEncoder(
+                    np.concatenate([previous_ids, new_ids.astype(previous_ids.dtype)])
+                )
+
+                self.rating_df[code_column] = encoder.encode(values)
+                encoders.append(encoder)
+
+                logger.info(
+                    f"{len(new_ids)} new {column} appended to {len(previous_ids)} encoded"
+                )
+
+            self.set_encoders(*encoders)
+        except Exception as e:
+            raise CustomException("Failed to extend encoding", sys)
+
+    def rating_delta(self, previous):
+        """Ratings that are new or changed since the last run."""
+
+        try:
+
+            def pair_keys(user_ids, anime_ids):
+                return (user_ids.astype(np.int64) << 32) | anime_ids.astype(np.uint32)
+
+            previous_keys = pair_keys(
+                previous["rating_df/user_id"], previous["rating_df/anime_id"]
+            )
+            order = np.argsort(previous_keys, kind="stable")
+            previous_keys = previous_keys[order]
+            previous_rating = previous["rating_df/rating"][order]
+
+            keys = pair_keys(
+                self.rating_df["user_id"].to_numpy(),
+                self.rating_df["anime_id"].to_numpy(),
+            )
+            positions = np.minimum(
+                np.searchsorted(previous_keys, keys), max(len(previous_keys) - 1, 0)
+            )
+
+            unchanged = np.zeros(len(keys), dtype=bool)
+            if len(previous_keys):
+                unchanged = (previous_keys[positions] == keys) & (
+                    previous_rating[positions]
+                    == self.rating_df["rating"].to_numpy(dtype=np.float32)
+                )
+
+            delta = self.rating_df[~unchanged]
+            logger.info(f"{len(delta)} new or changed ratings since the last run")
+            return delta
+        except Exception as e:
+            raise CustomException("Failed to compute the rating delta", sys)
+
+    def split_data(self, test_size=1000, random_state=43, df=None):
         try:
-            self.rating_df = self.rating_df.sample(
-                frac=1, random_state=random_state
-            ).reset_index(drop=True)
+            if df is None:
+                self.rating_df = self.rating_df.sample(
+                    frac=1, random_state=random_state
+                ).reset_index(drop=True)
+                df = self.rating_df
+            else:
+                # Only df is split (incremental delta), rating_df keeps every rating
+                df = df.sample(frac=1, random_state=random_state).reset_index(drop=True)
 
-            X = self.rating_df[["user", "anime"]].values
-            y = self.rating_df["rating"]
+            X = df[["user", "anime"]].values
+            y = df["rating"]
 
-            train_indices = self.rating_df.shape[0] - test_size
+            train_indices = df.shape[0] - test_size
 
             X_train, X_test, y_train, y_test = (
                 X[:train_indices],
@@ -127,10 +432,6 @@ class DataProcessor:
                 "user2user_decoded": self.user2user_decoded,
                 "anim2anime_encoded": self.anime2anime_encoded,
                 "anim2anime_decoded": self.anime2anime_decoded,
-                "X_train_array": self.X_train_array,
-                "X_test_array": self.X_test_array,
-                "y_train": self.y_train,
-                "y_test": self.y_test,
             }
 
             # Dump artifacts to access in later stages
@@ -138,7 +439,75 @@ class DataProcessor:
                 joblib.dump(data, os.path.join(self.output_dir, f"{name}.pkl"))
                 logger.info(f"{name} saved successfully in processed directory")
 
-            self.rating_df.to_csv(RATING_DF, index=False)
+            if self.rating_df is not None:
+                columns = {
+                    column: self.rating_df[column].to_numpy()
+                    for column in self.rating_df.columns
+                }
+                arrays = {
+                    "X_train_user": (X_TRAIN_USER, self.X_train_array[0]),
+                    "X_train_anime": (X_TRAIN_ANIME, self.X_train_array[1]),
+                    "X_test_user": (X_TEST_USER, self.X_test_array[0]),
+                    "X_test_anime": (X_TEST_ANIME, self.X_test_array[1]),
+                    "y_train": (Y_TRAIN, self.y_train.to_numpy(dtype=np.float32)),
+                    "y_test": (Y_TEST, self.y_test.to_numpy(dtype=np.float32)),
+                }
+                for column, values in columns.items():
+                    arrays[f"rating_df/{column}"] = (
+                        os.path.join(RATING_DF_DIR, f"{column}.npy"),
+                        values,
+                    )
+            else:
+                # Streaming mode already wrote the splits and rating_df columns to their files
+                columns = self.rating_columns
+                arrays = {
+                    "X_train_user": (X_TRAIN_USER, None),
+                    "X_train_anime": (X_TRAIN_ANIME, None),
+                    "X_test_user": (X_TEST_USER, None),
+                    "X_test_anime": (X_TEST_ANIME, None),
+                    "y_train": (Y_TRAIN, None),
+                    "y_test": (Y_TEST, None),
+                }
+                for column in columns:
+                    arrays[f"rating_df/{column}"] = (
+                        os.path.join(RATING_DF_DIR, f"{column}.npy"),
+                        None,
+                    )
+
+            # Per-user rating index so serving can slice a user's ratings without a table scan
+            rating_index = RatingIndex.build(
+                columns["user"],
+                columns["anime"],
+                columns["rating"],
+                n_users=len(self.user2user_encoded),
+            )
+
+            arrays.update(
+                {
+                    "user_ids": (USER_IDS, self.user_encoder.ids),
+                    "anime_ids": (ANIME_IDS, self.anime_encoder.ids),
+                    "rating_index_offsets": (
+                        RATING_INDEX_OFFSETS,
+                        rating_index.offsets,
+                    ),
+                    "rating_index_anime": (RATING_INDEX_ANIME, rating_index.anime),
+                    "rating_index_rating": (RATING_INDEX_RATING, rating_index.rating),
+                }
+            )
+
+            metadata = {
+                "n_users": len(self.user_encoder),
+                "n_anime": len(self.anime_encoder),
+                "n_train": len(self.y_train),
+                "n_test": len(self.y_test),
+                "rating_min": float(self.rating_range[0]),
+                "rating_max": float(self.rating_range[1]),
+                "incremental": self.previous_n_users is not None,
+                "previous_n_users": self.previous_n_users,
+                "previous_n_anime": self.previous_n_anime,
+            }
+
+            save_arrays(arrays, PROCESSED_MANIFEST, metadata=metadata)
 
             logger.info("Training, testing data, and rating_df saved successfully")
         except Exception as e:
@@ -153,20 +522,9 @@ class DataProcessor:
                 ANIME_SYNOPSIS_CSV, usecols=["MAL_ID", "Name", "Genres", "sypnopsis"]
             )
 
-            # Get anime name by ID
-            def getAnimeNameByID(anime_id):
-                try:
-                    name = anime_df[anime_df.anime_id == anime_id].eng_version.values[0]
-                    if name is np.nan:
-                        name = anime_df[anime_df.anime_id == anime_id].Name.values[0]
-                except:
-                    print("Error")
-                return name
-
-            # Set anime name
+            # Set anime name, falling back to the original name when there is no English name
             anime_df["anime_id"] = anime_df["MAL_ID"]
-            anime_df["eng_version"] = anime_df["English name"]
-            anime_df["eng_version"] = anime_df.anime_id.apply(lambda x: getAnimeNameByID(x))
+            anime_df["eng_version"] = anime_df["English name"].fillna(anime_df["Name"])
 
             anime_df.sort_values(
                 by=["Score"],
@@ -200,11 +558,55 @@ class DataProcessor:
     def run(self):
         try:
             logger.info("Starting data processing...")
-            self.load_data(usecols=["user_id", "anime_id", "rating"])
-            self.filter_users()
-            self.scale_ratings()
-            self.encode_data()
-            self.split_data()
+            usecols = ["user_id", "anime_id", "rating"]
+            min_rating = self.config.get("min_rating", 400)
+
+            streaming = self.config.get("streaming", False)
+            chunk_size = self.config.get("chunk_size", 1_000_000)
+
+            previous = self.load_previous_artifacts() if self.incremental else None
+
+            if streaming:
+                # Incremental runs keep the file order, encodings are extended from it
+                self.process_ratings_streaming(
+                    usecols,
+                    min_rating=min_rating,
+                    chunk_size=chunk_size,
+                    random_state=43 if previous is None else None,
+                )
+
+                if previous is not None:
+                    # The delta against the last run is computed on in-memory ratings
+                    self.rating_df = pd.DataFrame(
+                        {
+                            name: np.array(values)
+                            for name, values in self.rating_columns.items()
+                        }
+                    )
+                    self.rating_columns = None
+            else:
+                self.load_data(usecols=usecols)
+                self.filter_users(min_rating=min_rating)
+                self.scale_ratings()
+                if previous is None:
+                    self.encode_data()
+
+            if previous is not None:
+                # Stable encodings, and only the new ratings are used for fine-tuning
+                logger.info("Incremental processing against the last run")
+                self.previous_n_users = len(previous["user_ids"])
+                self.previous_n_anime = len(previous["anime_ids"])
+
+                self.apply_rating_range(previous["rating_range"])
+                self.extend_encoding(previous)
+
+                delta = self.rating_delta(previous)
+                self.split_data(test_size=min(1000, len(delta) // 10), df=delta)
+            elif streaming:
+                self.split_streamed(chunk_size=chunk_size)
+            else:
+                self.split_data()
+
             self.save_artifacts()
 
             self.process_anime_data()
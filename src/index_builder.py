@@ -0,0 +1,110 @@
+import json
+import time
+
+import joblib
+import numpy as np
+
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from config.paths_config import *
+from utils.common import read_yaml
+from utils.ann_index import IVFIndex, recall_at_k
+from utils.similarity import build_neighbour_table, weights_fingerprint
+
+logger = get_logger(__name__)
+
+
+class IndexBuilder:
+    def __init__(self, config_path):
+        try:
+            self.config = read_yaml(config_path)
+            self.ann_config = self.config["ann"]
+            logger.info("Index builder initialized successfully")
+        except Exception as e:
+            raise CustomException("Error loading configuration", e)
+
+    def report_recall(self, name, index, weights):
+        # Recall@10 against the exact search and mean query latency for a range of n_probe values
+        n_queries = min(self.ann_config["recall_queries"], len(weights))
+        rng = np.random.default_rng(43)
+        queries = rng.choice(len(weights), n_queries, replace=False)
+
+        n_probes = sorted({1, 2, 4, 8, 16, 32, self.ann_config["n_probe"]})
+        n_probes = [n_probe for n_probe in n_probes if 0 < n_probe <= index.n_lists]
+
+        for n_probe in n_probes:
+            recall = recall_at_k(index, weights, queries, k=10, n_probe=n_probe)
+
+            start = time.perf_counter()
+            for query in queries:
+                index.search(weights, weights[query], 10, n_probe=n_probe)
+            elapsed = (time.perf_counter() - start) / n_queries
+
+            logger.info(
+                f"{name} ANN index n_probe={n_probe}: recall@10={recall:.4f}, "
+                f"{elapsed * 1e3:.3f} ms/query"
+            )
+
+    def build_ann_index(self, name, weights_path, index_dir):
+        try:
+            weights = joblib.load(weights_path)
+
+            index = IVFIndex.build(
+                weights,
+                n_lists=self.ann_config["n_lists"],
+                n_iter=self.ann_config["n_iter"],
+            )
+            index.save(index_dir)
+
+            logger.info(
+                f"{name} ANN index with {index.n_lists} lists saved to {index_dir}"
+            )
+            self.report_recall(name, index, weights)
+        except Exception as e:
+            logger.error(str(e))
+            raise CustomException(f"Error while building the {name} ANN index", e)
+
+    def build_anime_neighbours(self):
+        try:
+            anime_weights = joblib.load(ANIME_WEIGHTS_PATH)
+            neighbours_config = self.config["anime_neighbours"]
+
+            start = time.perf_counter()
+            ids, scores = build_neighbour_table(
+                anime_weights,
+                k=neighbours_config["k"],
+                block_size=neighbours_config["block_size"],
+            )
+
+            np.save(ANIME_NEIGHBOUR_IDS, ids)
+            np.save(ANIME_NEIGHBOUR_SCORES, scores)
+
+            # Lets the engine tell a table left behind by an earlier model apart
+            with open(ANIME_NEIGHBOUR_META, "w") as meta_file:
+                json.dump(
+                    {"weights_fingerprint": weights_fingerprint(anime_weights)},
+                    meta_file,
+                )
+
+            logger.info(
+                f"Top {ids.shape[1]} neighbours of {len(ids)} animes saved in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+        except Exception as e:
+            logger.error(str(e))
+            raise CustomException("Error while building the anime neighbour table", e)
+
+    def run(self):
+        try:
+            logger.info("Starting index building...")
+            self.build_ann_index("user", USER_WEIGHTS_PATH, USER_ANN_INDEX_DIR)
+            self.build_ann_index("anime", ANIME_WEIGHTS_PATH, ANIME_ANN_INDEX_DIR)
+            self.build_anime_neighbours()
+            logger.info("Index building completed")
+        except CustomException as e:
+            logger.error(str(e))
+
+
+if __name__ == "__main__":
+    index_builder = IndexBuilder(CONFIG_PATH)
+    index_builder.run()
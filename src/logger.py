@@ -3,12 +3,23 @@ import os
 from datetime import datetime
 
 LOGS_DIR = "logs"
-os.makedirs(LOGS_DIR, exist_ok=True)
 
 LOG_FILE = os.path.join(LOGS_DIR, f"log_{datetime.now().strftime('%Y-%m-%d')}.log")
 
+
+class LazyFileHandler(logging.FileHandler):
+    # Importing the logger never touches the filesystem, the logs directory and file
+    # are only created when the first record is written
+    def __init__(self, filename):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 logging.basicConfig(
-    filename=LOG_FILE,
+    handlers=[LazyFileHandler(LOG_FILE)],
     format="%(asctime)s - %(levelname)s - %(message)s",
     level=logging.INFO,
 )
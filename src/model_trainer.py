@@ -1,25 +1,61 @@
 import os
+import time
 
 import joblib
 import comet_ml
 import numpy as np
+import tensorflow as tf
+from tensorflow.keras import mixed_precision
 from tensorflow.keras.callbacks import (
+    Callback,
     ModelCheckpoint,
     LearningRateScheduler,
     EarlyStopping,
 )
+from tensorflow.keras.models import load_model
 
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from src.base_model import BaseModel
 from config.paths_config import *
+from utils.artifact_store import load_arrays, read_manifest
+from utils.common import read_yaml
 
 logger = get_logger(__name__)
 
 
+class EpochTimer(Callback):
+    """Log the wall-clock time and throughput of every epoch."""
+
+    def __init__(self, n_examples, experiment=None):
+        super().__init__()
+        self.n_examples = n_examples
+        self.experiment = experiment
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self.start
+        examples_per_sec = self.n_examples / seconds
+
+        logger.info(
+            f"Epoch {epoch + 1}: {seconds:.1f}s, {examples_per_sec:,.0f} examples/sec"
+        )
+
+        if self.experiment is not None:
+            self.experiment.log_metric("epoch_seconds", seconds, step=epoch)
+            self.experiment.log_metric("examples_per_sec", examples_per_sec, step=epoch)
+
+
 class ModelTrainer:
     def __init__(self, data_path):
         self.data_path = data_path
+        self.config = read_yaml(CONFIG_PATH)
+        self.performance = self.config.get("training", {}).get("performance", {})
+
+        # Thread pools have to be set before TensorFlow initializes its runtime
+        self.configure_tensorflow()
 
         self.experiment = comet_ml.Experiment(
             api_key="",
@@ -29,25 +65,130 @@ class ModelTrainer:
 
         logger.info("Model trainer and COMET ML initialized successfully")
 
+    def configure_tensorflow(self):
+        try:
+            intra_op_threads = self.performance.get("intra_op_threads", 0)
+            inter_op_threads = self.performance.get("inter_op_threads", 0)
+            policy = self.performance.get("mixed_precision", "float32")
+
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+            mixed_precision.set_global_policy(policy)
+
+            logger.info(
+                f"TensorFlow configured with intra_op_threads={intra_op_threads}, "
+                f"inter_op_threads={inter_op_threads}, precision policy {policy}"
+            )
+        except Exception as e:
+            raise CustomException("Failed to configure TensorFlow", e)
+
     def load_data(self):
         try:
-            X_train_array = joblib.load(X_TRAIN_ARRAY)
-            X_test_array = joblib.load(X_TEST_ARRAY)
-            y_train = joblib.load(Y_TRAIN)
-            y_test = joblib.load(Y_TEST)
+            # Memory-mapped, zero-copy views of the processed arrays
+            arrays = load_arrays(
+                PROCESSED_MANIFEST,
+                names=[
+                    "X_train_user",
+                    "X_train_anime",
+                    "X_test_user",
+                    "X_test_anime",
+                    "y_train",
+                    "y_test",
+                ],
+                mmap_mode="r",
+            )
+
+            X_train_array = [arrays["X_train_user"], arrays["X_train_anime"]]
+            X_test_array = [arrays["X_test_user"], arrays["X_test_anime"]]
+            y_train = arrays["y_train"]
+            y_test = arrays["y_test"]
 
             logger.info("Data loaded successfully for model training")
             return X_train_array, X_test_array, y_train, y_test
         except Exception as e:
             raise CustomException("Failed to load data", e)
 
+    def make_dataset(self, X_array, y, batch_size, training=True):
+        """
+        Stream (X, y) batches from the memory-mapped arrays with tf.data.
+
+        The rows are split into contiguous shards that are read block by block and
+        interleaved in parallel, so only the shuffle buffer and a few blocks per shard
+        are held in memory instead of the whole dataset.
+
+        Args:
+            X_array: [user, anime] arrays
+            y: Scaled ratings
+            batch_size: Examples per batch
+            training: Shuffle the shards and the examples (validation data is read in order)
+        """
+
+        try:
+            cfg = self.config.get("training", {}).get("tf_data", {})
+            shard_size = cfg.get("shard_size", 1000000)
+            block_size = cfg.get("read_block_size", 65536)
+
+            user, anime = X_array
+            n_rows = len(y)
+
+            def read_shard(start):
+                stop = min(start + shard_size, n_rows)
+                for block in range(start, stop, block_size):
+                    end = min(block + block_size, stop)
+
+                    # Keras inputs have shape [1]
+                    yield (
+                        {
+                            "user": np.asarray(user[block:end]).reshape(-1, 1),
+                            "anime": np.asarray(anime[block:end]).reshape(-1, 1),
+                        },
+                        np.asarray(y[block:end]),
+                    )
+
+            output_signature = (
+                {
+                    "user": tf.TensorSpec([None, 1], tf.as_dtype(user.dtype)),
+                    "anime": tf.TensorSpec([None, 1], tf.as_dtype(anime.dtype)),
+                },
+                tf.TensorSpec([None], tf.as_dtype(y.dtype)),
+            )
+
+            starts = np.arange(0, n_rows, shard_size, dtype=np.int64)
+            shards = tf.data.Dataset.from_tensor_slices(starts)
+            if training:
+                shards = shards.shuffle(len(starts))
+
+            dataset = shards.interleave(
+                lambda start: tf.data.Dataset.from_generator(
+                    read_shard, output_signature=output_signature, args=(start,)
+                ),
+                cycle_length=cfg.get("cycle_length", 4),
+                num_parallel_calls=tf.data.AUTOTUNE,
+                deterministic=not training,
+            ).unbatch()
+
+            if training:
+                dataset = dataset.shuffle(cfg.get("shuffle_buffer", 1000000))
+
+            return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+        except Exception as e:
+            raise CustomException("Failed to build the tf.data input pipeline", e)
+
     def train(self):
         try:
             X_train_array, X_test_array, y_train, y_test = self.load_data()
 
             # Get the number of users and anime
-            n_users = len(joblib.load(USER2USER_ENCODED))
-            n_anime = len(joblib.load(ANIME2ANIME_ENCODED))
+            metadata = read_manifest(PROCESSED_MANIFEST)["metadata"]
+            n_users = metadata["n_users"]
+            n_anime = metadata["n_anime"]
+
+            incremental = metadata.get("incremental", False)
+            if incremental and metadata["n_train"] == 0:
+                logger.info(
+                    "No new ratings since the last run, keeping the current model"
+                )
+                return
 
             # Create the base model
             base_model = BaseModel(config_path=CONFIG_PATH)
@@ -55,11 +196,18 @@ class ModelTrainer:
             # Create the model
             model = base_model.RecommenderNet(n_users=n_users, n_anime=n_anime)
 
+            if incremental:
+                # Fine-tune the last model on the new ratings only
+                self.warm_start(model)
+
             # Callbacks
             start_lr = 0.00001
             min_lr = 0.0001
             max_lr = 0.00005
-            batch_size = 10000
+            batch_size = self.performance.get("batch_size", 10000)
+            epochs = self.performance.get("epochs", 20)
+            if incremental:
+                epochs = self.config.get("incremental", {}).get("epochs", 3)
 
             ramup_epochs = 5
             sustain_epochs = 0
@@ -90,32 +238,63 @@ class ModelTrainer:
                 patience=3, monitor="val_loss", mode="min", restore_best_weights=True
             )
 
-            my_callbacks = [model_checkpoint, lr_callback, early_stopping]
+            epoch_timer = EpochTimer(len(y_train), self.experiment)
+
+            # Incremental deltas of a few ratings have no validation rows, they are trained
+            # without val_loss based checkpointing and early stopping
+            validate = len(y_test) > 0
+            if validate:
+                my_callbacks = [
+                    model_checkpoint,
+                    lr_callback,
+                    early_stopping,
+                    epoch_timer,
+                ]
+            else:
+                logger.warning("No validation data, training without checkpointing")
+                my_callbacks = [lr_callback, epoch_timer]
 
             os.makedirs(os.path.dirname(CHECKPOINT_FILE_PATH), exist_ok=True)
             os.makedirs(MODEL_DIR, exist_ok=True)
             os.makedirs(WEIGHTS_DIR, exist_ok=True)
 
+            input_pipeline = self.config.get("training", {}).get(
+                "input_pipeline", "numpy"
+            )
+            logger.info(f"Training with the {input_pipeline} input pipeline")
+
+            if input_pipeline == "tf_data":
+                # Batching is done by the datasets
+                fit_data = dict(x=self.make_dataset(X_train_array, y_train, batch_size))
+                if validate:
+                    fit_data["validation_data"] = self.make_dataset(
+                        X_test_array, y_test, batch_size, training=False
+                    )
+            else:
+                fit_data = dict(x=X_train_array, y=y_train, batch_size=batch_size)
+                if validate:
+                    fit_data["validation_data"] = (X_test_array, y_test)
+
             try:
                 history = model.fit(
-                    x=X_train_array,
-                    y=y_train,
-                    batch_size=batch_size,
-                    epochs=20,
+                    **fit_data,
+                    epochs=epochs,
                     verbose=1,
-                    validation_data=(X_test_array, y_test),
                     callbacks=my_callbacks,
                 )
 
-                model.load_weights(CHECKPOINT_FILE_PATH)
+                # The checkpoint is only written by this run when there is validation data
+                if validate:
+                    model.load_weights(CHECKPOINT_FILE_PATH)
                 logger.info("Model training completed successfully")
 
                 for epoch in range(len(history.history["loss"])):
                     train_loss = history.history["loss"][epoch]
-                    val_loss = history.history["val_loss"][epoch]
-
                     self.experiment.log_metric("train_loss", train_loss, step=epoch)
-                    self.experiment.log_metric("val_loss", val_loss, step=epoch)
+
+                    if validate:
+                        val_loss = history.history["val_loss"][epoch]
+                        self.experiment.log_metric("val_loss", val_loss, step=epoch)
 
             except Exception as e:
                 raise CustomException("Model training failed", e)
@@ -127,6 +306,35 @@ class ModelTrainer:
             logger.error(str(e))
             raise CustomException("Error during model training process", e)
 
+    def warm_start(self, model):
+        """
+        Initialize model from the saved model of the last run.
+
+        Encodings are stable across incremental runs, so the previous embedding rows are
+        copied into the (grown) tables and only rows of new users / animes keep their
+        fresh initialization. Every other layer is copied as is.
+        """
+
+        try:
+            if not os.path.exists(MODEL_PATH):
+                raise FileNotFoundError(f"No saved model at {MODEL_PATH}")
+
+            previous = load_model(MODEL_PATH, compile=False)
+
+            for layer, previous_layer in zip(model.layers, previous.layers):
+                weights = previous_layer.get_weights()
+
+                if layer.name in ("user_embedding", "anime_embedding"):
+                    table = layer.get_weights()[0]
+                    table[: len(weights[0])] = weights[0]
+                    weights = [table]
+
+                layer.set_weights(weights)
+
+            logger.info(f"Model warm started from {MODEL_PATH}")
+        except Exception as e:
+            raise CustomException("Failed to warm start from the saved model", e)
+
     def extract_weights(self, layer_name, model):
         try:
             # Get the weight layer
@@ -155,6 +363,14 @@ class ModelTrainer:
             joblib.dump(user_weights, USER_WEIGHTS_PATH)
             joblib.dump(anime_weights, ANIME_WEIGHTS_PATH)
 
+            # Raw matrices that serving can memory-map instead of unpickling per worker
+            np.save(USER_WEIGHTS_NPY, user_weights.astype(np.float32))
+            np.save(ANIME_WEIGHTS_NPY, anime_weights.astype(np.float32))
+
+            if self.config.get("weights", {}).get("save_float16", False):
+                np.save(USER_WEIGHTS_F16_NPY, user_weights.astype(np.float16))
+                np.save(ANIME_WEIGHTS_F16_NPY, anime_weights.astype(np.float16))
+
             self.experiment.log_asset(MODEL_PATH)
             self.experiment.log_asset(ANIME_WEIGHTS_PATH)
             self.experiment.log_asset(USER_WEIGHTS_PATH)
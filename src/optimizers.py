@@ -0,0 +1,77 @@
+import tensorflow as tf
+
+
+class LazyAdam(tf.keras.optimizers.Adam):
+    """
+    Adam that only updates the embedding rows gathered in the current batch.
+
+    For sparse (IndexedSlices) gradients, as produced by Embedding layers, regular Adam
+    decays the moment estimates of every row of the table on every step. LazyAdam reads,
+    updates and writes back only the moments and weights of the rows in the batch, so the
+    cost of a step no longer grows with the number of users and animes. Dense gradients
+    use the regular Adam update.
+
+    Works with the Keras 2 (TF 2.11 - 2.15) and Keras 3 optimizer APIs: Keras 3 passes
+    the learning rate to update_step and scatters through the optimizer, Keras 2 does not.
+    """
+
+    def update_step(self, gradient, variable, learning_rate=None):
+        keras_3 = learning_rate is not None
+
+        if not isinstance(gradient, tf.IndexedSlices):
+            if keras_3:
+                return super().update_step(gradient, variable, learning_rate)
+            return super().update_step(gradient, variable)
+
+        var_dtype = variable.dtype
+        lr = tf.cast(learning_rate if keras_3 else self.learning_rate, var_dtype)
+        local_step = tf.cast(self.iterations + 1, var_dtype)
+        beta_1 = tf.cast(self.beta_1, var_dtype)
+        beta_2 = tf.cast(self.beta_2, var_dtype)
+        epsilon = tf.cast(self.epsilon, var_dtype)
+
+        alpha = lr * tf.sqrt(1 - tf.pow(beta_2, local_step))
+        alpha = alpha / (1 - tf.pow(beta_1, local_step))
+
+        if keras_3:
+            index = self._get_variable_index(variable)
+        else:
+            index = self._index_dict[self._var_key(variable)]
+        m = self._momentums[index]
+        v = self._velocities[index]
+
+        # Sum the gradients of rows gathered more than once in the batch
+        indices, positions = tf.unique(gradient.indices)
+        values = tf.math.unsorted_segment_sum(
+            tf.cast(gradient.values, var_dtype), positions, tf.shape(indices)[0]
+        )
+
+        m_rows = beta_1 * tf.gather(m, indices) + (1 - beta_1) * values
+        v_rows = beta_2 * tf.gather(v, indices) + (1 - beta_2) * tf.square(values)
+        updates = tf.IndexedSlices(
+            alpha * m_rows / (tf.sqrt(v_rows) + epsilon), indices
+        )
+
+        # IndexedSlices values are scattered into the rows instead of the whole table
+        if keras_3:
+            self.assign(m, tf.IndexedSlices(m_rows, indices))
+            self.assign(v, tf.IndexedSlices(v_rows, indices))
+            self.assign_sub(variable, updates)
+        else:
+            m.scatter_update(tf.IndexedSlices(m_rows, indices))
+            v.scatter_update(tf.IndexedSlices(v_rows, indices))
+            variable.scatter_sub(updates)
+
+
+def get_optimizer(name):
+    """Optimizer for model.compile: LazyAdam, or any optimizer name Keras resolves itself."""
+
+    if name == "LazyAdam":
+        # Keras before 2.11 only has the legacy optimizers, without update_step
+        if not hasattr(tf.keras.optimizers.Adam, "update_step"):
+            raise ValueError(
+                "LazyAdam needs TensorFlow 2.11 or later, use another optimizer"
+            )
+        return LazyAdam()
+
+    return name
@@ -0,0 +1,1070 @@
+import hashlib
+import inspect
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from config.paths_config import *
+from utils.common import read_yaml
+from utils.ann_index import IVFIndex
+from utils.id_encoder import IdEncoder
+from utils.metadata_store import AnimeMetadataStore
+from utils.rating_index import RatingIndex, concat_ranges
+from utils.similarity import dot_scores, top_k, weights_fingerprint
+
+logger = get_logger(__name__)
+
+
+class RecommenderEngine:
+    """
+    Holds every serving artifact (weights, encoders and processed frames) in memory
+    so they are loaded once per process instead of once per helper call.
+
+    The .npy weights, array encoders, rating index, ANN indexes and neighbour table sit
+    next to the artifact they are built from. Unless passed explicitly, their paths are
+    derived from the weights, encoder and rating_df paths, so a custom weights or
+    encoder path never serves the default artifacts.
+    """
+
+    def __init__(
+        self,
+        anime_weights_path=ANIME_WEIGHTS_PATH,
+        user_weights_path=USER_WEIGHTS_PATH,
+        anime_weights_npy_path=None,
+        user_weights_npy_path=None,
+        anime_weights_f16_npy_path=None,
+        user_weights_f16_npy_path=None,
+        anime2anime_encoded_path=ANIME2ANIME_ENCODED,
+        anime2anime_decoded_path=ANIME2ANIME_DECODED,
+        user2user_encoded_path=USER2USER_ENCODED,
+        user2user_decoded_path=USER2USER_DECODED,
+        user_ids_path=None,
+        anime_ids_path=None,
+        rating_df_path=RATING_DF,
+        anime_df_path=ANIME_DF,
+        synopsis_df_path=SYNOPSIS_DF,
+        rating_index_offsets_path=None,
+        rating_index_anime_path=None,
+        rating_index_rating_path=None,
+        user_ann_index_dir=None,
+        anime_ann_index_dir=None,
+        anime_neighbour_ids_path=None,
+        anime_neighbour_scores_path=None,
+        anime_neighbour_meta_path=None,
+        batch_recommendations_path=BATCH_RECOMMENDATIONS,
+        batch_recommendations_meta_path=BATCH_RECOMMENDATIONS_META,
+        config_path=CONFIG_PATH,
+    ):
+        self.anime_weights_path = anime_weights_path
+        self.user_weights_path = user_weights_path
+        self.anime_weights_npy_path = anime_weights_npy_path or _with_suffix(
+            anime_weights_path, ".npy"
+        )
+        self.user_weights_npy_path = user_weights_npy_path or _with_suffix(
+            user_weights_path, ".npy"
+        )
+        self.anime_weights_f16_npy_path = anime_weights_f16_npy_path or _with_suffix(
+            anime_weights_path, "_f16.npy"
+        )
+        self.user_weights_f16_npy_path = user_weights_f16_npy_path or _with_suffix(
+            user_weights_path, "_f16.npy"
+        )
+        self.anime2anime_encoded_path = anime2anime_encoded_path
+        self.anime2anime_decoded_path = anime2anime_decoded_path
+        self.user2user_encoded_path = user2user_encoded_path
+        self.user2user_decoded_path = user2user_decoded_path
+        self.user_ids_path = user_ids_path or _sibling(user2user_encoded_path, USER_IDS)
+        self.anime_ids_path = anime_ids_path or _sibling(
+            anime2anime_encoded_path, ANIME_IDS
+        )
+        self.rating_df_path = rating_df_path
+        self.anime_df_path = anime_df_path
+        self.synopsis_df_path = synopsis_df_path
+        self.rating_index_offsets_path = rating_index_offsets_path or _sibling(
+            rating_df_path, RATING_INDEX_OFFSETS
+        )
+        self.rating_index_anime_path = rating_index_anime_path or _sibling(
+            rating_df_path, RATING_INDEX_ANIME
+        )
+        self.rating_index_rating_path = rating_index_rating_path or _sibling(
+            rating_df_path, RATING_INDEX_RATING
+        )
+        self.user_ann_index_dir = user_ann_index_dir or _sibling(
+            user_weights_path, USER_ANN_INDEX_DIR
+        )
+        self.anime_ann_index_dir = anime_ann_index_dir or _sibling(
+            anime_weights_path, ANIME_ANN_INDEX_DIR
+        )
+        self.anime_neighbour_ids_path = anime_neighbour_ids_path or _sibling(
+            anime_weights_path, ANIME_NEIGHBOUR_IDS
+        )
+        self.anime_neighbour_scores_path = anime_neighbour_scores_path or _sibling(
+            anime_weights_path, ANIME_NEIGHBOUR_SCORES
+        )
+        self.anime_neighbour_meta_path = anime_neighbour_meta_path or _sibling(
+            anime_weights_path, ANIME_NEIGHBOUR_META
+        )
+        self.batch_recommendations_path = batch_recommendations_path
+        self.batch_recommendations_meta_path = batch_recommendations_meta_path
+        self.config_path = config_path
+
+        self.anime_weights = None
+        self.user_weights = None
+        self.anime2anime_encoded = {}
+        self.anime2anime_decoded = {}
+        self.user2user_encoded = {}
+        self.user2user_decoded = {}
+        self.anime_encoder = None
+        self.rating_df = None
+        self.anime_df = None
+        self.synopsis_df = None
+        self.metadata = None
+        self.rating_index = None
+        self.anime_ids = None
+        self.anime_without_metadata = None
+        self.anime_row_offsets = None
+        self.anime_rows = None
+        self.aggregation_threads = 1
+        self.parallel_min_users = 1000
+        self._executor = None
+        self.user_ann_index = None
+        self.anime_ann_index = None
+        self.anime_neighbour_ids = None
+        self.anime_neighbour_scores = None
+        self.n_probe = 0
+        self.fold_in_l2 = 1.0
+        self.model_version = None
+        self.batch_recommendations = None
+        self.batch_recommendations_meta = None
+
+        self.load()
+
+    def load(self):
+        try:
+            self.config = read_yaml(self.config_path)
+
+            weights_dtype = self.config.get("weights", {}).get(
+                "serving_dtype", "float32"
+            )
+            self.anime_weights = self._load_weights(
+                self.anime_weights_path,
+                self.anime_weights_npy_path,
+                self.anime_weights_f16_npy_path,
+                weights_dtype,
+            )
+            self.user_weights = self._load_weights(
+                self.user_weights_path,
+                self.user_weights_npy_path,
+                self.user_weights_f16_npy_path,
+                weights_dtype,
+            )
+
+            # Array encoders expose the same dict-like lookups without unpickling dicts
+            if os.path.exists(self.user_ids_path) and os.path.exists(
+                self.anime_ids_path
+            ):
+                user_encoder = IdEncoder.load(self.user_ids_path)
+                self.anime_encoder = IdEncoder.load(self.anime_ids_path)
+
+                self.user2user_encoded = user_encoder.encoded
+                self.user2user_decoded = user_encoder.decoded
+                self.anime2anime_encoded = self.anime_encoder.encoded
+                self.anime2anime_decoded = self.anime_encoder.decoded
+            else:
+                # joblib is only needed for artifacts written before the array encoders
+                import joblib
+
+                self.anime2anime_encoded = joblib.load(self.anime2anime_encoded_path)
+                self.anime2anime_decoded = joblib.load(self.anime2anime_decoded_path)
+                self.user2user_encoded = joblib.load(self.user2user_encoded_path)
+                self.user2user_decoded = joblib.load(self.user2user_decoded_path)
+
+            # Encoded anime -> anime id, used to decode rating index slices
+            self.anime_ids = np.array(
+                [
+                    self.anime2anime_decoded[i]
+                    for i in range(len(self.anime2anime_decoded))
+                ]
+            )
+
+            # Memory-map the per-user rating index, only fall back to the full csv without it
+            rating_index_paths = (
+                self.rating_index_offsets_path,
+                self.rating_index_anime_path,
+                self.rating_index_rating_path,
+            )
+            if all(os.path.exists(path) for path in rating_index_paths):
+                self.rating_index = RatingIndex.load(*rating_index_paths, mmap_mode="r")
+                logger.info("Rating index memory-mapped successfully")
+            else:
+                self.rating_df = pd.read_csv(self.rating_df_path)
+
+            self.anime_df = pd.read_csv(self.anime_df_path)
+            self.synopsis_df = pd.read_csv(self.synopsis_df_path)
+            self.metadata = AnimeMetadataStore(self.anime_df, self.synopsis_df)
+
+            # Encoded animes that cannot be recommended with a name and synopsis
+            self.anime_without_metadata = np.array(
+                [
+                    anime_id not in self.metadata.rows_by_id
+                    or anime_id not in self.metadata.synopsis_rows_by_id
+                    for anime_id in self.anime_ids
+                ],
+                dtype=bool,
+            )
+
+            # anime_df rows of every encoded anime (CSR layout, rows in frame order)
+            encoded_of_row = np.array(
+                [
+                    self.anime2anime_encoded.get(anime_id, -1)
+                    for anime_id in self.metadata.anime_id
+                ],
+                dtype=np.int64,
+            )
+            known_rows = np.flatnonzero(encoded_of_row >= 0)
+            self.anime_rows = known_rows[
+                np.argsort(encoded_of_row[known_rows], kind="stable")
+            ]
+            self.anime_row_offsets = np.zeros(len(self.anime_ids) + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(encoded_of_row[known_rows], minlength=len(self.anime_ids)),
+                out=self.anime_row_offsets[1:],
+            )
+
+            aggregation_config = self.config.get("user_recommendations", {})
+            self.aggregation_threads = aggregation_config.get("n_threads", 1)
+            self.parallel_min_users = aggregation_config.get("parallel_min_users", 1000)
+
+            # ANN indexes are optional, without them similarity search stays exact
+            self.n_probe = self.config.get("ann", {}).get("n_probe", 0)
+            self.fold_in_l2 = self.config.get("fold_in", {}).get("l2", 1.0)
+            self.user_ann_index = self._load_ann_index(
+                "user", self.user_ann_index_dir, self.user_weights
+            )
+            self.anime_ann_index = self._load_ann_index(
+                "anime", self.anime_ann_index_dir, self.anime_weights
+            )
+
+            # Precomputed anime neighbours turn content queries into a row lookup
+            # (their float16 scores stay within 1e-3 of the float32 similarities)
+            neighbour_paths = (
+                self.anime_neighbour_ids_path,
+                self.anime_neighbour_scores_path,
+                self.anime_neighbour_meta_path,
+            )
+            if all(os.path.exists(path) for path in neighbour_paths):
+                with open(self.anime_neighbour_meta_path, "r") as meta_file:
+                    meta = json.load(meta_file)
+
+                neighbour_ids = np.load(self.anime_neighbour_ids_path, mmap_mode="r")
+                built_on_weights = len(neighbour_ids) == len(self.anime_weights) and (
+                    meta["weights_fingerprint"]
+                    == weights_fingerprint(self.anime_weights)
+                )
+
+                # A stale table has no rows for the animes added since, only serve it when
+                # built on the loaded weights and use the exact search otherwise
+                if built_on_weights:
+                    self.anime_neighbour_ids = neighbour_ids
+                    self.anime_neighbour_scores = np.load(
+                        self.anime_neighbour_scores_path, mmap_mode="r"
+                    )
+                else:
+                    logger.warning(
+                        "Ignoring the anime neighbour table of other weights"
+                    )
+
+            self.model_version = self._artifact_version()
+
+            # Batch scoring results, only served when computed with the loaded model
+            if os.path.exists(self.batch_recommendations_path) and os.path.exists(
+                self.batch_recommendations_meta_path
+            ):
+                with open(self.batch_recommendations_meta_path, "r") as meta_file:
+                    meta = json.load(meta_file)
+
+                if meta["model_version"] == self.model_version:
+                    self.batch_recommendations = np.load(
+                        self.batch_recommendations_path, mmap_mode="r"
+                    )
+                    self.batch_recommendations_meta = meta
+                else:
+                    logger.warning("Ignoring batch recommendations of another model")
+
+            logger.info(
+                f"Recommender engine artifacts loaded successfully "
+                f"(model version {self.model_version})"
+            )
+        except Exception as e:
+            logger.error(f"Error while loading recommender engine artifacts {e}")
+            raise CustomException("Failed to load recommender engine artifacts", e)
+
+    def _artifact_version(self):
+        # Changes whenever a weights artifact is rewritten (size or modification time)
+        paths = (
+            self.anime_weights_path,
+            self.user_weights_path,
+            self.anime_weights_npy_path,
+            self.user_weights_npy_path,
+            self.anime_weights_f16_npy_path,
+            self.user_weights_f16_npy_path,
+        )
+
+        stats = [
+            (path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+            for path in paths
+            if os.path.exists(path)
+        ]
+        return hashlib.md5(repr(stats).encode()).hexdigest()[:12]
+
+    @staticmethod
+    def _load_ann_index(name, index_dir, weights):
+        # A stale index never returns the rows added since it was built, so drop it
+        if not IVFIndex.exists(index_dir):
+            return None
+
+        ann_index = IVFIndex.load(index_dir)
+        if not ann_index.matches(weights):
+            logger.warning(
+                f"Ignoring the {name} ANN index of other weights, rebuild it to use it"
+            )
+            return None
+
+        return ann_index
+
+    @staticmethod
+    def _load_weights(pkl_path, npy_path, f16_npy_path, weights_dtype):
+        # Read-only memory maps are shared through the page cache by every worker process
+        if weights_dtype == "float16" and os.path.exists(f16_npy_path):
+            return np.load(f16_npy_path, mmap_mode="r")
+
+        if os.path.exists(npy_path):
+            return np.load(npy_path, mmap_mode="r")
+
+        import joblib
+
+        return joblib.load(pkl_path)
+
+    def touch_memory_maps(self):
+        """Read every page of the memory-mapped artifacts, so queries do not fault them in."""
+
+        arrays = [
+            self.anime_weights,
+            self.user_weights,
+            self.anime_neighbour_ids,
+            self.anime_neighbour_scores,
+            self.batch_recommendations,
+        ]
+        if self.rating_index is not None:
+            arrays += [
+                self.rating_index.offsets,
+                self.rating_index.anime,
+                self.rating_index.rating,
+            ]
+        for ann_index in (self.user_ann_index, self.anime_ann_index):
+            if ann_index is not None:
+                arrays.append(ann_index.ids)
+
+        n_bytes = 0
+        for array in arrays:
+            if isinstance(array, np.memmap):
+                # One byte per page is enough to bring the page into memory
+                array.reshape(-1).view(np.uint8)[:: mmap.PAGESIZE].sum()
+                n_bytes += array.nbytes
+
+        return n_bytes
+
+    # Get the anime frame for a given anime id or name
+    def get_anime_frame(self, anime):
+        return self.metadata.frame(anime)
+
+    # Get the synopsis for a given anime id or name
+    def get_synopsis(self, anime):
+        return self.metadata.get_synopsis(anime)
+
+    def _nearest(
+        self,
+        weights,
+        ann_index,
+        encoded_index,
+        n,
+        neg,
+        n_probe,
+        neighbours=None,
+        neighbour_scores=None,
+    ):
+        # Best n matches (best first) with their similarities, from the precomputed
+        # neighbour table when usable, otherwise from a search
+        if neighbours is not None and not neg and n <= neighbours.shape[1]:
+            closest = np.asarray(neighbours[encoded_index, :n])
+            return closest, neighbour_scores[encoded_index, :n].astype(np.float32)
+
+        query = np.asarray(weights[encoded_index], dtype=np.float32)
+        return self._search(weights, ann_index, query, n, neg, n_probe)
+
+    def _search(self, weights, ann_index, query, n, neg, n_probe):
+        # Best n matches of a query vector, from an ANN index when usable, otherwise exact
+        if n_probe is None:
+            n_probe = self.n_probe
+
+        if ann_index is not None and n_probe > 0 and not neg:
+            return ann_index.search(weights, query, n, n_probe=n_probe)
+
+        dists = dot_scores(weights, query)
+        closest = top_k(dists, n, neg=neg)
+        return closest, dists[closest]
+
+    # Content-based recommendation
+    def find_similar_animes(
+        self, name, n=10, return_dist=False, neg=False, n_probe=None
+    ):
+        """
+        Find similar animes to the given anime name using content-based filtering.
+
+        Args:
+            name: Name of the anime to find similar animes to
+            n: Number of similar animes to return
+            return_dist: Whether to return the distances
+            neg: Whether to return the farthest animes
+            n_probe: ANN clusters to scan, None uses the configured value and 0 forces an exact search
+        """
+
+        # Get the anime ID for the given name
+        index = self.metadata.anime_id[self.metadata.row(name)]
+        encoded_index = self.anime2anime_encoded.get(index)
+
+        if encoded_index is None:
+            raise ValueError(f"Encoded index not found for anime ID: {index}")
+
+        weights = self.anime_weights
+
+        # Add 1 to include this anime itself in the results
+        n = n + 1
+
+        # Return distances and closest indices (in ascending distance order) if requested
+        if return_dist:
+            dists = dot_scores(weights, weights[encoded_index])
+            closest = top_k(dists, n, neg=neg)
+            return dists, closest if neg else closest[::-1]
+
+        # Select closest or farthest based on 'neg' flag, best match first
+        closest, similarities = self._nearest(
+            weights,
+            self.anime_ann_index,
+            encoded_index,
+            n,
+            neg,
+            n_probe,
+            neighbours=self.anime_neighbour_ids,
+            neighbour_scores=self.anime_neighbour_scores,
+        )
+
+        # Order by similarity and drop the anime itself (at most n - 1 remain when
+        # the search did not return it)
+        if neg:
+            closest, similarities = closest[::-1], similarities[::-1]
+        keep = closest != encoded_index
+        closest, similarities = closest[keep][: n - 1], similarities[keep][: n - 1]
+
+        # Build the similarity array
+        SimilarityArr = []
+        for close, similarity in zip(closest, similarities):
+            row = self.metadata.row(self.anime2anime_decoded.get(close))
+            anime_name = self.metadata.eng_version[row]
+            genre = self.metadata.genres[row]
+
+            SimilarityArr.append(
+                {
+                    "name": anime_name,
+                    "similarity": similarity,
+                    "genre": genre,
+                }
+            )
+
+        return pd.DataFrame(SimilarityArr)
+
+    def find_similar_animes_batch(self, names, n=10):
+        """
+        Find similar animes for several anime names at once.
+        All queries are scored with a single matrix-matrix product against the anime weights.
+
+        Args:
+            names: Names of the animes to find similar animes to
+            n: Number of similar animes to return per name
+
+        Returns:
+            A list aligned with names holding the same DataFrame as find_similar_animes,
+            or None for names that cannot be resolved to an encoded anime
+        """
+
+        encoded_indices = self.encode_anime_names(names)
+        queries = encoded_indices[encoded_indices >= 0]
+        results = [None] * len(names)
+
+        if len(queries) == 0:
+            return results
+
+        closest, similarities = self._similar_anime_arrays(queries, n)
+
+        row = 0
+        for position, encoded_index in enumerate(encoded_indices):
+            if encoded_index < 0:
+                continue
+
+            keep = closest[row] != encoded_index
+
+            SimilarityArr = []
+            for close, similarity in zip(closest[row][keep], similarities[row][keep]):
+                anime_row = self.metadata.row(self.anime2anime_decoded.get(close))
+
+                SimilarityArr.append(
+                    {
+                        "name": self.metadata.eng_version[anime_row],
+                        "similarity": similarity,
+                        "genre": self.metadata.genres[anime_row],
+                    }
+                )
+
+            results[position] = pd.DataFrame(SimilarityArr)
+            row += 1
+
+        return results
+
+    def encode_anime_ids(self, anime_ids):
+        """Encoded indices of the anime ids known to the model."""
+
+        # One binary search over the array encoder instead of a lookup per id
+        if self.anime_encoder is not None and len(anime_ids) > 0:
+            encoded = self.anime_encoder.encode(list(anime_ids))
+            return encoded[encoded >= 0].astype(np.int64)
+
+        encoded = [self.anime2anime_encoded.get(anime_id) for anime_id in anime_ids]
+        return np.array([i for i in encoded if i is not None], dtype=np.int64)
+
+    def encode_anime_names(self, names):
+        """Encoded index of every anime name, -1 for names that cannot be resolved."""
+
+        encoded_indices = np.full(len(names), -1, dtype=np.int64)
+        for position, name in enumerate(names):
+            rows = self.metadata.rows(name)
+
+            if rows is not None and len(rows) > 0:
+                encoded_index = self.anime2anime_encoded.get(
+                    self.metadata.anime_id[rows[0]]
+                )
+                if encoded_index is not None:
+                    encoded_indices[position] = encoded_index
+
+        return encoded_indices
+
+    def _similar_anime_arrays(self, queries, n):
+        # Closest n + 1 encoded animes of every query (itself included) and their similarities
+        weights = self.anime_weights
+        neighbours = self.anime_neighbour_ids
+
+        if neighbours is not None and n + 1 <= neighbours.shape[1]:
+            # Row lookups in the precomputed neighbour table
+            closest = np.asarray(neighbours[queries, : n + 1])
+            similarities = self.anime_neighbour_scores[queries, : n + 1].astype(
+                np.float32
+            )
+        else:
+            # One GEMM for every query instead of a GEMV per anime
+            dists = dot_scores(weights, weights[queries])
+            closest = top_k(dists, n + 1)
+            similarities = np.take_along_axis(dists, closest, axis=1)
+
+        return closest, similarities
+
+    def get_similar_anime_scores(self, encoded_animes, n=10):
+        """
+        Flat (encoded animes, similarities) of the n most similar animes of every given
+        encoded anime, without the animes themselves. Used as a dense score signal.
+        """
+
+        encoded_animes = np.asarray(encoded_animes, dtype=np.int64)
+        if len(encoded_animes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        closest, similarities = self._similar_anime_arrays(encoded_animes, n)
+        keep = closest != encoded_animes[:, None]
+
+        return closest[keep], similarities[keep]
+
+    # User-based recommendation (collaborative filtering)
+    def find_similar_users(
+        self, item_input, n=10, return_dist=False, neg=False, n_probe=None
+    ):
+        """
+        Find similar users to the given user id using collaborative filtering.
+        Works the same as find_similar_animes, just for users instead of animes.
+
+        Args:
+            item_input: User id to find similar users to
+            n: Number of similar users to return
+            return_dist: Whether to return the distances
+            neg: Whether to return the farthest users
+            n_probe: ANN clusters to scan, None uses the configured value and 0 forces an exact search
+        """
+
+        try:
+            if not isinstance(item_input, int):
+                raise TypeError(f"User id must be an int, got {type(item_input)}")
+
+            index = item_input
+            encoded_index = self.user2user_encoded.get(index)
+
+            if encoded_index is None:
+                raise ValueError(f"Encoded index not found for user ID: {index}")
+
+            weights = self.user_weights
+
+            n = n + 1
+
+            if return_dist:
+                dists = dot_scores(weights, weights[encoded_index])
+                closest = top_k(dists, n, neg=neg)
+                return dists, closest if neg else closest[::-1]
+
+            closest, similarities = self._nearest(
+                weights, self.user_ann_index, encoded_index, n, neg, n_probe
+            )
+
+            # Order by similarity and drop the user itself from the results
+            if neg:
+                closest, similarities = closest[::-1], similarities[::-1]
+            keep = closest != encoded_index
+            closest, similarities = closest[keep][: n - 1], similarities[keep][: n - 1]
+
+            SimilarityArr = []
+
+            for close, similarity in zip(closest, similarities):
+                decoded_id = self.user2user_decoded.get(close)
+                SimilarityArr.append(
+                    {"similar_users": decoded_id, "similarity": similarity}
+                )
+
+            return pd.DataFrame(SimilarityArr)
+        except Exception as e:
+            print("Error Occured", e)
+
+    def fold_in_user(self, ratings):
+        """
+        Embed a user unknown to the model from their ratings, without retraining.
+
+        Solves a ridge least-squares problem for the vector whose similarities to the frozen
+        anime weights best fit the user's standardized ratings. It lives in the same space
+        as the trained user weights, so it can be searched against them.
+
+        Args:
+            ratings: {anime id: rating} of the user, animes unknown to the model are ignored
+
+        Returns:
+            The L2-normalized float32 user vector
+        """
+
+        anime_ids = list(ratings.keys())
+        encoded = np.array(
+            [self.anime2anime_encoded.get(anime_id, -1) for anime_id in anime_ids],
+            dtype=np.int64,
+        )
+        known = encoded >= 0
+
+        if not known.any():
+            raise ValueError("None of the rated animes are known to the model")
+
+        A = np.asarray(self.anime_weights[encoded[known]], dtype=np.float32)
+        rating = np.asarray(list(ratings.values()), dtype=np.float32)[known]
+
+        vector = np.zeros(A.shape[1], dtype=np.float32)
+        if rating.std() > 0:
+            target = (rating - rating.mean()) / rating.std()
+
+            # Solve in the smaller of the two dimensions (ratings or embedding size)
+            if len(A) < A.shape[1]:
+                gram = np.dot(A, A.T) + self.fold_in_l2 * np.eye(len(A))
+                vector = np.dot(A.T, np.linalg.solve(gram, target))
+            else:
+                gram = np.dot(A.T, A) + self.fold_in_l2 * np.eye(A.shape[1])
+                vector = np.linalg.solve(gram, np.dot(A.T, target))
+
+        # Identical ratings carry no preference between the animes, use their centroid
+        if not np.linalg.norm(vector) > 0:
+            vector = A.sum(axis=0)
+
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def find_similar_users_to_vector(self, user_vector, n=10, n_probe=None):
+        """
+        Find the users closest to a user vector, e.g. one returned by fold_in_user.
+        Returns the same DataFrame as find_similar_users.
+        """
+
+        closest, similarities = self._search(
+            self.user_weights, self.user_ann_index, user_vector, n, False, n_probe
+        )
+
+        SimilarityArr = []
+        for close, similarity in zip(closest, similarities):
+            decoded_id = self.user2user_decoded.get(close)
+            SimilarityArr.append(
+                {"similar_users": decoded_id, "similarity": similarity}
+            )
+
+        return pd.DataFrame(SimilarityArr)
+
+    def get_preferences_from_ratings(self, ratings):
+        """Same as get_user_preferences, from the {anime id: rating} of a user."""
+
+        anime_ids = np.asarray(list(ratings.keys()))
+        rating = np.asarray(list(ratings.values()), dtype=np.float32)
+
+        # Top rated animes (75th percentile and above)
+        top_animes_user = anime_ids[rating >= np.percentile(rating, 75)]
+
+        anime_df_rows = self.anime_df.iloc[self.metadata.rows_for_ids(top_animes_user)]
+        return anime_df_rows[["eng_version", "Genres"]]
+
+    # Get user preferences
+    def get_user_preferences(self, user_id):
+        df = self.anime_df
+
+        if self.rating_index is not None:
+            encoded_user = self.user2user_encoded.get(user_id)
+            if encoded_user is None:
+                raise ValueError(f"Encoded index not found for user ID: {user_id}")
+
+            # Top rated animes (75th percentile and above) straight from the user's slice
+            top_animes_user = self.anime_ids[self.rating_index.top_items(encoded_user)]
+
+            anime_df_rows = df.iloc[self.metadata.rows_for_ids(top_animes_user)]
+            return anime_df_rows[["eng_version", "Genres"]]
+
+        rating_df = self.rating_df
+        animes_watched_by_user = rating_df[rating_df.user_id == user_id]
+
+        # Get the 75th percentile rating (top rated animes)
+        user_rating_percentile = np.percentile(animes_watched_by_user.rating, 75)
+
+        # Filter the animes watched by the user to only include those with a rating greater than or equal to the 75th percentile
+        animes_watched_by_user = animes_watched_by_user[
+            animes_watched_by_user.rating >= user_rating_percentile
+        ]
+
+        # Get the top rated animes watched by the user
+        top_animes_user = animes_watched_by_user.sort_values(
+            by="rating", ascending=False
+        ).anime_id.values
+
+        anime_df_rows = df[df["anime_id"].isin(top_animes_user)]
+        anime_df_rows = anime_df_rows[["eng_version", "Genres"]]
+
+        return anime_df_rows
+
+    def get_anime_names(self, anime_ids):
+        return [self.metadata.eng_version[self.metadata.row(i)] for i in anime_ids]
+
+    def get_precomputed_recommendations(
+        self, user_id, n, user_weight, content_weight, user_scorer
+    ):
+        """
+        Batch scoring result of a user as anime ids, best first.
+
+        None when there is no result for this user or the request parameters differ from the
+        ones the batch was computed with, the caller then runs the live pipeline.
+        """
+
+        meta = self.batch_recommendations_meta
+        if self.batch_recommendations is None or n > meta["n"]:
+            return None
+
+        if (user_weight, content_weight, user_scorer) != (
+            meta["user_weight"],
+            meta["content_weight"],
+            meta["user_scorer"],
+        ):
+            return None
+
+        encoded_user = self.user2user_encoded.get(user_id)
+        if encoded_user is None:
+            return None
+
+        anime_ids = self.batch_recommendations[encoded_user]
+        anime_ids = anime_ids[anime_ids >= 0]
+
+        # Empty rows are users the batch failed to score
+        return anime_ids[:n] if len(anime_ids) else None
+
+    # Get user recommendations
+    def get_user_recommendations(self, similar_users, user_pref, n=10):
+        """
+        Get user recommendations based on similar users and their preferences.
+
+        Args:
+            similar_users: DataFrame of similar users
+            user_pref: DataFrame of this user's preferences
+            n: Number of recommendations to return
+        """
+
+        recommended_animes = []
+        user_ids = [int(user_id) for user_id in similar_users.similar_users.values]
+
+        # Names recommended by the similar users, most recommended first
+        if self.rating_index is not None:
+            anime_names, counts = self._count_preferences(user_ids, user_pref)
+        else:
+            anime_names, counts = self._count_preferences_loop(user_ids, user_pref)
+
+        if len(anime_names):
+            # Get the top n anime and the number of times the similar users recommended them
+            for anime_name, n_user_pref in zip(anime_names[:n], counts[:n]):
+                if isinstance(anime_name, str):
+                    row = self.metadata.row(anime_name)
+                    anime_id = self.metadata.anime_id[row]
+                    genre = self.metadata.genres[row]
+                    synopsis = self.get_synopsis(int(anime_id))
+
+                    recommended_animes.append(
+                        {
+                            "n": n_user_pref,
+                            "anime_name": anime_name,
+                            "Genres": genre,
+                            "Synopsis": synopsis,
+                        }
+                    )
+
+        return pd.DataFrame(recommended_animes).head(n)
+
+    def _count_preferences_loop(self, user_ids, user_pref):
+        anime_list = []
+
+        for user_id in user_ids:
+            # Get the preferences of the similar users
+            pref_list = self.get_user_preferences(user_id)
+
+            # Remove the animes that this user has already watched
+            pref_list = pref_list[
+                ~pref_list.eng_version.isin(user_pref.eng_version.values)
+            ]
+
+            if not pref_list.empty:
+                anime_list.append(pref_list.eng_version.values)
+
+        if not anime_list:
+            return [], []
+
+        anime_list = pd.DataFrame(anime_list)
+        sorted_list = pd.Series(anime_list.values.ravel()).value_counts()
+        return sorted_list.index, sorted_list.values
+
+    def _preference_rows(self, encoded_users):
+        # (segment, anime_df row) of the top rated animes of every user, unique rows in
+        # frame order inside each segment, as get_user_preferences returns them
+        segments, animes = self.rating_index.top_items_many(encoded_users)
+
+        starts = self.anime_row_offsets[animes]
+        lengths = self.anime_row_offsets[animes + 1] - starts
+        rows = self.anime_rows[concat_ranges(starts, lengths)]
+        segments = np.repeat(segments, lengths)
+
+        n_rows = len(self.anime_df)
+        keys = np.unique(segments * n_rows + rows)
+        return keys // n_rows, keys % n_rows
+
+    def _count_preferences(self, user_ids, user_pref):
+        """
+        Preferences of several similar users counted in one grouped pass.
+
+        Same result as concatenating the get_user_preferences names of every user (minus
+        the names in user_pref) and calling value_counts: most frequent first, ties in
+        order of first occurrence.
+        """
+
+        encoded_users = []
+        for user_id in user_ids:
+            encoded_user = self.user2user_encoded.get(user_id)
+            if encoded_user is None:
+                raise ValueError(f"Encoded index not found for user ID: {user_id}")
+            encoded_users.append(encoded_user)
+
+        if not encoded_users:
+            return [], []
+
+        encoded_users = np.array(encoded_users, dtype=np.int64)
+
+        if (
+            self.aggregation_threads > 1
+            and len(encoded_users) >= self.parallel_min_users
+        ):
+            # Blocks of users on a thread pool, numpy releases the GIL in the heavy steps
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.aggregation_threads)
+
+            blocks = np.array_split(encoded_users, self.aggregation_threads)
+            block_starts = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+            results = list(self._executor.map(self._preference_rows, blocks))
+
+            segments = np.concatenate(
+                [
+                    block_segments + start
+                    for (block_segments, _), start in zip(results, block_starts)
+                ]
+            )
+            rows = np.concatenate([block_rows for _, block_rows in results])
+        else:
+            segments, rows = self._preference_rows(encoded_users)
+
+        # Remove the animes that this user has already watched
+        anime_names = self.metadata.eng_version[rows]
+        seen = pd.Series(anime_names).isin(user_pref.eng_version.values).to_numpy()
+        anime_names = anime_names[~seen]
+
+        # Count every name, codes follow the order of first occurrence
+        codes, uniques = pd.factorize(anime_names)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        order = np.argsort(-counts, kind="stable")
+
+        return uniques[order], counts[order]
+
+    def get_user_vector(self, user_id):
+        encoded_user = self.user2user_encoded.get(user_id)
+        if encoded_user is None:
+            raise ValueError(f"Encoded index not found for user ID: {user_id}")
+
+        return np.asarray(self.user_weights[encoded_user], dtype=np.float32)
+
+    def get_watched_encoded(self, user_id):
+        """Encoded indices of every anime the user rated."""
+
+        if self.rating_index is not None:
+            encoded_user = self.user2user_encoded.get(user_id)
+            if encoded_user is None:
+                raise ValueError(f"Encoded index not found for user ID: {user_id}")
+
+            # The rating index already holds encoded animes, no decode / encode round trip
+            return np.asarray(self.rating_index.user_ratings(encoded_user)[0])
+
+        return self.encode_anime_ids(self.get_watched_animes(user_id))
+
+    def get_watched_animes(self, user_id):
+        """Ids of every anime the user rated."""
+
+        if self.rating_index is not None:
+            encoded_user = self.user2user_encoded.get(user_id)
+            if encoded_user is None:
+                raise ValueError(f"Encoded index not found for user ID: {user_id}")
+
+            return self.anime_ids[self.rating_index.user_ratings(encoded_user)[0]]
+
+        rating_df = self.rating_df
+        return rating_df[rating_df.user_id == user_id].anime_id.values
+
+    def get_direct_recommendations(self, user_vector, encoded_watched=(), n=10):
+        """
+        Recommend the animes scoring highest against the user vector, in one pass.
+
+        Scores every anime with user_vector @ anime_weights.T instead of aggregating the
+        preferences of similar users, masks out the watched animes and keeps the top n.
+
+        Args:
+            user_vector: Normalized user vector, e.g. from get_user_vector or fold_in_user
+            encoded_watched: Encoded indices of the animes the user already watched,
+                e.g. from get_watched_encoded
+            n: Number of recommendations to return
+        """
+
+        scores = dot_scores(self.anime_weights, user_vector)
+
+        # Watched animes and animes without metadata are never recommended
+        scores[self.anime_without_metadata] = -np.inf
+        scores[np.asarray(encoded_watched, dtype=np.int64)] = -np.inf
+
+        return self._recommendation_frame(top_k(scores, n), scores)
+
+    def get_direct_recommendations_batch(self, user_ids, n=10):
+        """
+        get_direct_recommendations for many users with a single matrix-matrix product.
+
+        Returns:
+            A list aligned with user_ids of recommendation DataFrames, None for unknown users
+        """
+
+        encoded_users = [self.user2user_encoded.get(user_id) for user_id in user_ids]
+        known = [i for i, encoded in enumerate(encoded_users) if encoded is not None]
+        results = [None] * len(user_ids)
+
+        if not known:
+            return results
+
+        user_vectors = self.user_weights[[encoded_users[i] for i in known]]
+        scores = dot_scores(self.anime_weights, user_vectors)
+
+        scores[:, self.anime_without_metadata] = -np.inf
+        for row, i in enumerate(known):
+            scores[row, self.get_watched_encoded(user_ids[i])] = -np.inf
+
+        best = top_k(scores, n)
+        for row, i in enumerate(known):
+            results[i] = self._recommendation_frame(best[row], scores[row])
+
+        return results
+
+    def _recommendation_frame(self, encoded_animes, scores):
+        # Recommendations of the best first encoded animes, excluded (-inf) ones are dropped
+        recommended_animes = []
+        for encoded_anime in encoded_animes:
+            if scores[encoded_anime] == -np.inf:
+                break
+
+            anime_id = self.anime_ids[encoded_anime]
+            row = self.metadata.row(anime_id)
+
+            recommended_animes.append(
+                {
+                    "anime_id": anime_id,
+                    "score": scores[encoded_anime],
+                    "anime_name": self.metadata.eng_version[row],
+                    "Genres": self.metadata.genres[row],
+                    "Synopsis": self.get_synopsis(int(anime_id)),
+                }
+            )
+
+        return pd.DataFrame(recommended_animes)
+
+
+# One engine per distinct set of artifact paths, shared by the whole process
+_engines = {}
+
+
+def _with_suffix(path, suffix):
+    # weights/anime_weights.pkl -> weights/anime_weights<suffix>
+    return os.path.splitext(path)[0] + suffix
+
+
+def _sibling(path, default_path):
+    # Artifact named like default_path, in the directory of path
+    return os.path.join(os.path.dirname(path), os.path.basename(default_path))
+
+
+def get_engine(**paths):
+    """
+    Return the process-wide engine for the given artifact paths, loading it on first use.
+    Paths that are not passed fall back to the defaults in config.paths_config.
+    """
+
+    bound = inspect.signature(RecommenderEngine).bind(**paths)
+    bound.apply_defaults()
+    key = tuple(bound.arguments.items())
+    engine = _engines.get(key)
+
+    if engine is None:
+        engine = RecommenderEngine(**paths)
+        _engines[key] = engine
+
+    return engine
@@ -0,0 +1,89 @@
+import os
+import sys
+
+# Tests import the repo packages (src, utils, pipeline, config) from the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_engine_artifacts(directory, n_users=60, n_anime=40, seed=0):
+    """
+    Small synthetic serving artifacts and the RecommenderEngine paths to load them.
+
+    Ratings are integers with many ties, some users have a single rating, some animes have
+    several or no anime_df rows, share a name or have no name, and a few have no synopsis.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    from utils.rating_index import RatingIndex
+
+    rng = np.random.default_rng(seed)
+    weights_dir = os.path.join(directory, "weights")
+    processed_dir = os.path.join(directory, "processed")
+    os.makedirs(weights_dir)
+    os.makedirs(processed_dir)
+
+    user_ids = np.arange(500, 500 + n_users)
+    anime_ids = np.arange(1000, 1000 + n_anime)
+
+    for name, n in (("user", n_users), ("anime", n_anime)):
+        weights = rng.standard_normal((n, 8)).astype(np.float32)
+        weights /= np.linalg.norm(weights, axis=1, keepdims=True)
+        np.save(os.path.join(weights_dir, f"{name}_weights.npy"), weights)
+
+    np.save(os.path.join(processed_dir, "user_ids.npy"), user_ids)
+    np.save(os.path.join(processed_dir, "anime_ids.npy"), anime_ids)
+
+    users, animes, ratings = [], [], []
+    for user in range(n_users):
+        n_ratings = 1 if user % 7 == 0 else int(rng.integers(2, n_anime))
+        users += [user] * n_ratings
+        animes += list(rng.choice(n_anime, n_ratings, replace=False))
+        ratings += list(rng.integers(1, 11, n_ratings) / 10)
+
+    RatingIndex.build(users, animes, ratings, n_users=n_users).save(
+        os.path.join(processed_dir, "rating_index_offsets.npy"),
+        os.path.join(processed_dir, "rating_index_anime.npy"),
+        os.path.join(processed_dir, "rating_index_rating.npy"),
+    )
+
+    names = [f"Anime {i % (n_anime - 5)}" for i in range(n_anime)]
+    anime_df = pd.DataFrame(
+        {
+            "anime_id": anime_ids,
+            "eng_version": names,
+            "Score": rng.uniform(1, 10, n_anime).round(2),
+            "Genres": "Action, Comedy",
+        }
+    )
+    anime_df.loc[[3, 11], "eng_version"] = np.nan
+    anime_df = pd.concat([anime_df.drop([5, 6]), anime_df.iloc[[8, 9]]])
+    anime_df = anime_df.sample(frac=1, random_state=seed)
+    anime_df.to_csv(os.path.join(processed_dir, "anime_df.csv"), index=False)
+
+    synopsis_df = pd.DataFrame(
+        {
+            "MAL_ID": anime_ids[2:],
+            "Name": names[2:],
+            "Genres": "Action, Comedy",
+            "sypnopsis": [f"Synopsis {i}" for i in range(2, n_anime)],
+        }
+    )
+    synopsis_df.to_csv(os.path.join(processed_dir, "synopsis_df.csv"), index=False)
+
+    return dict(
+        anime_weights_path=os.path.join(weights_dir, "anime_weights.pkl"),
+        user_weights_path=os.path.join(weights_dir, "user_weights.pkl"),
+        anime2anime_encoded_path=os.path.join(processed_dir, "anim2anime_encoded.pkl"),
+        anime2anime_decoded_path=os.path.join(processed_dir, "anim2anime_decoded.pkl"),
+        user2user_encoded_path=os.path.join(processed_dir, "user2user_encoded.pkl"),
+        user2user_decoded_path=os.path.join(processed_dir, "user2user_decoded.pkl"),
+        rating_df_path=os.path.join(processed_dir, "rating_df.csv"),
+        anime_df_path=os.path.join(processed_dir, "anime_df.csv"),
+        synopsis_df_path=os.path.join(processed_dir, "synopsis_df.csv"),
+        batch_recommendations_path=os.path.join(directory, "recommendations.npy"),
+        batch_recommendations_meta_path=os.path.join(directory, "recommendations.json"),
+        config_path=os.path.join(ROOT, "config", "config.yaml"),
+    )
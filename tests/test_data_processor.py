@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import src.data_processor as data_processor
+from src.data_processor import DataProcessor
+
+from conftest import ROOT
+
+
+def make_catalogue(directory, n_anime=500, seed=0):
+    rng = np.random.default_rng(seed)
+    anime_ids = rng.choice(50000, n_anime, replace=False)
+
+    english = np.array([f"English {i}" for i in range(n_anime)], dtype=object)
+    english[rng.random(n_anime) < 0.4] = "Unknown"
+
+    names = np.array([f"Name {i}" for i in range(n_anime)], dtype=object)
+    names[rng.random(n_anime) < 0.05] = "Unknown"
+
+    anime = pd.DataFrame(
+        {
+            "MAL_ID": anime_ids,
+            "Name": names,
+            "English name": english,
+            "Score": np.where(
+                rng.random(n_anime) < 0.1,
+                "Unknown",
+                np.round(rng.uniform(1, 10, n_anime), 2).astype(str),
+            ),
+            "Genres": "Action, Comedy",
+            "Episodes": rng.integers(1, 100, n_anime),
+            "Type": "TV",
+            "Premiered": "Spring 2000",
+            "Members": rng.integers(1, 10**6, n_anime),
+        }
+    )
+    synopsis = pd.DataFrame(
+        {
+            "MAL_ID": anime_ids,
+            "Name": names,
+            "Genres": "Action, Comedy",
+            "sypnopsis": [f"Synopsis {i}" for i in range(n_anime)],
+        }
+    )
+
+    anime_csv = os.path.join(directory, "anime.csv")
+    synopsis_csv = os.path.join(directory, "anime_with_synopsis.csv")
+    anime.to_csv(anime_csv, index=False)
+    synopsis.to_csv(synopsis_csv, index=False)
+    return anime_csv, synopsis_csv
+
+
+def previous_eng_version(anime_csv):
+    # process_anime_data before the fillna rewrite: a per-row lookup of every anime id
+    anime_df = pd.read_csv(anime_csv)
+    anime_df = anime_df.replace("Unknown", np.nan)
+
+    def getAnimeNameByID(anime_id):
+        name = anime_df[anime_df.anime_id == anime_id].eng_version.values[0]
+        if name is np.nan:
+            name = anime_df[anime_df.anime_id == anime_id].Name.values[0]
+        return name
+
+    anime_df["anime_id"] = anime_df["MAL_ID"]
+    anime_df["eng_version"] = anime_df["English name"]
+    anime_df["eng_version"] = anime_df.anime_id.apply(lambda x: getAnimeNameByID(x))
+
+    return anime_df.set_index("anime_id").eng_version
+
+
+def test_eng_version_matches_previous_implementation(tmp_path, monkeypatch):
+    anime_csv, synopsis_csv = make_catalogue(tmp_path)
+    anime_df_path = os.path.join(tmp_path, "anime_df.csv")
+
+    monkeypatch.setattr(data_processor, "ANIME_CSV", anime_csv)
+    monkeypatch.setattr(data_processor, "ANIME_SYNOPSIS_CSV", synopsis_csv)
+    monkeypatch.setattr(data_processor, "ANIME_DF", anime_df_path)
+    monkeypatch.setattr(
+        data_processor, "SYNOPSIS_DF", os.path.join(tmp_path, "synopsis_df.csv")
+    )
+
+    processor = DataProcessor(
+        os.path.join(tmp_path, "animelist.csv"),
+        os.path.join(tmp_path, "processed"),
+        config_path=os.path.join(ROOT, "config", "config.yaml"),
+    )
+    processor.process_anime_data()
+
+    processed = pd.read_csv(anime_df_path)
+    expected = previous_eng_version(anime_csv)
+
+    assert len(processed) == len(expected)
+    # Both English and original names missing stay missing
+    assert processed.eng_version.isna().any()
+    pd.testing.assert_series_equal(
+        processed.set_index("anime_id").eng_version,
+        expected.loc[processed.anime_id].rename_axis("anime_id"),
+        check_dtype=False,
+    )
@@ -0,0 +1,47 @@
+import pytest
+
+from utils.micro_batcher import MicroBatcher
+
+
+def test_items_are_batched_and_resolved_in_order():
+    batches = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, window_ms=50)
+    try:
+        pending = [batcher.submit(item) for item in range(5)]
+        assert [future.result(timeout=5) for future in pending] == [0, 2, 4, 6, 8]
+    finally:
+        batcher.close()
+
+    assert sum(len(batch) for batch in batches) == 5
+    assert len(batches) < 5
+
+
+def test_missing_results_fail_every_future():
+    # A batch_fn returning fewer results than items must not leave futures pending
+    batcher = MicroBatcher(lambda items: list(items)[:-1], window_ms=50)
+    try:
+        pending = [batcher.submit(item) for item in range(3)]
+        for future in pending:
+            with pytest.raises(ValueError, match="2 results for 3 items"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_batch_fn_errors_fail_every_future():
+    def batch_fn(items):
+        raise RuntimeError("scoring failed")
+
+    batcher = MicroBatcher(batch_fn, window_ms=50)
+    try:
+        pending = [batcher.submit(item) for item in range(3)]
+        for future in pending:
+            with pytest.raises(RuntimeError, match="scoring failed"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
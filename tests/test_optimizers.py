@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from src.optimizers import LazyAdam
+
+
+def sparse_steps(optimizer, steps):
+    table = tf.Variable(np.ones((6, 3), dtype=np.float32))
+    for indices, values in steps:
+        gradient = tf.IndexedSlices(
+            tf.constant(values, dtype=tf.float32),
+            tf.constant(indices),
+            tf.constant([6, 3]),
+        )
+        optimizer.apply_gradients([(gradient, table)])
+    return table.numpy()
+
+
+def test_lazy_adam_only_updates_gathered_rows():
+    steps = [([0, 2], [[1.0] * 3, [-2.0] * 3]), ([4], [[0.5] * 3])]
+    table = sparse_steps(LazyAdam(learning_rate=0.1), steps)
+
+    np.testing.assert_array_equal(table[[1, 3, 5]], 1.0)
+    assert not np.allclose(table[[0, 2, 4]], 1.0)
+    # Row 0 keeps its first step only, Adam would have kept moving it on the second
+    first_step = sparse_steps(LazyAdam(learning_rate=0.1), steps[:1])
+    np.testing.assert_allclose(table[0], first_step[0])
+
+
+def test_lazy_adam_first_step_matches_adam():
+    # Before any moment has built up, the lazy and the regular updates are the same
+    steps = [([1, 3, 5], [[1.0, -1.0, 0.5]] * 3)]
+
+    np.testing.assert_allclose(
+        sparse_steps(LazyAdam(learning_rate=0.1), steps),
+        sparse_steps(tf.keras.optimizers.Adam(learning_rate=0.1), steps),
+        rtol=1e-6,
+    )
+
+
+def test_lazy_adam_sums_duplicate_rows():
+    # A row gathered twice is updated once, with the summed gradient
+    duplicated = sparse_steps(LazyAdam(learning_rate=0.1), [([2, 2], [[1.0] * 3] * 2)])
+    summed = sparse_steps(LazyAdam(learning_rate=0.1), [([2], [[2.0] * 3])])
+
+    np.testing.assert_allclose(duplicated, summed)
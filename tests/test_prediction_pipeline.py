@@ -0,0 +1,25 @@
+from pipeline.prediction_pipeline import warm_up
+from src.recommender_engine import RecommenderEngine
+
+from conftest import make_engine_artifacts
+
+
+def test_warm_up_counts_failing_queries(tmp_path):
+    engine = RecommenderEngine(**make_engine_artifacts(str(tmp_path)))
+
+    def get_anime_names(anime_ids):
+        raise IndexError("anime without a synopsis")
+
+    # Every per-user query fails, only the batched direct scoring still succeeds
+    engine.get_anime_names = get_anime_names
+
+    assert warm_up(engine, n_queries=4) == (1, 8)
+
+
+def test_warm_up_succeeds_on_valid_engine(tmp_path):
+    engine = RecommenderEngine(**make_engine_artifacts(str(tmp_path)))
+
+    succeeded, failed = warm_up(engine, n_queries=4)
+
+    assert succeeded > 0
+    assert succeeded + failed == 9
@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.recommender_engine import RecommenderEngine
+from utils.ann_index import IVFIndex
+from utils.similarity import build_neighbour_table, weights_fingerprint
+
+from conftest import make_engine_artifacts
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    return RecommenderEngine(**make_engine_artifacts(str(tmp_path_factory.mktemp("e"))))
+
+
+def neighbour_sets(engine, n_sets=200, seed=0):
+    # Random similar users with the preferences of a random user, as the pipeline passes them
+    rng = np.random.default_rng(seed)
+    user_ids = np.array([engine.user2user_decoded[i] for i in range(60)])
+
+    for _ in range(n_sets):
+        similar = rng.choice(user_ids, int(rng.integers(1, 25)), replace=False)
+        user_pref = engine.get_user_preferences(int(rng.choice(user_ids)))
+        yield [int(user_id) for user_id in similar], user_pref
+
+
+@pytest.mark.parametrize("percentile", [0, 50, 75, 90, 100])
+def test_top_items_many_matches_top_items(engine, percentile):
+    rating_index = engine.rating_index
+    users = np.array([7, 0, 3, 14, 59, 3, 21])
+
+    segments, animes = rating_index.top_items_many(users, percentile=percentile)
+
+    for segment, user in enumerate(users):
+        np.testing.assert_array_equal(
+            animes[segments == segment],
+            rating_index.top_items(user, percentile=percentile),
+        )
+
+
+def test_count_preferences_matches_previous_loop(engine):
+    tied = single_rating = 0
+
+    for similar, user_pref in neighbour_sets(engine):
+        names, counts = engine._count_preferences(similar, user_pref)
+        expected_names, expected_counts = engine._count_preferences_loop(
+            similar, user_pref
+        )
+
+        # Same names in the same value_counts order, ties in order of first occurrence
+        assert list(names) == list(expected_names)
+        assert list(counts) == list(expected_counts)
+
+        tied += int(np.any(np.diff(counts) == 0))
+        single_rating += sum(user_id % 7 == 500 % 7 for user_id in similar)
+
+    # The comparison covered tied counts and users with a single rating
+    assert tied > 0 and single_rating > 0
+
+
+def test_count_preferences_on_threads_matches_serial(engine):
+    for similar, user_pref in neighbour_sets(engine, n_sets=50, seed=1):
+        serial = engine._count_preferences(similar, user_pref)
+
+        engine.aggregation_threads, engine.parallel_min_users = 3, 2
+        try:
+            threaded = engine._count_preferences(similar, user_pref)
+        finally:
+            engine.aggregation_threads, engine.parallel_min_users = 1, 1000
+
+        assert list(threaded[0]) == list(serial[0])
+        assert list(threaded[1]) == list(serial[1])
+
+
+def test_count_preferences_rejects_unknown_users(engine):
+    with pytest.raises(ValueError):
+        engine._count_preferences([500, 42], pd.DataFrame({"eng_version": []}))
+
+
+def test_stale_ann_index_is_dropped(tmp_path):
+    paths = make_engine_artifacts(str(tmp_path))
+    weights_dir = os.path.dirname(paths["user_weights_path"])
+    user_weights = np.load(os.path.join(weights_dir, "user_weights.npy"))
+
+    # An index over the current weights is served
+    IVFIndex.build(user_weights, n_lists=4).save(
+        os.path.join(weights_dir, "user_ann_index")
+    )
+    assert RecommenderEngine(**paths).user_ann_index is not None
+
+    # An index left behind before the last 5 users were added is not
+    IVFIndex.build(user_weights[:-5], n_lists=4).save(
+        os.path.join(weights_dir, "user_ann_index")
+    )
+    engine = RecommenderEngine(**paths)
+    assert engine.user_ann_index is None
+
+    similar = engine.find_similar_users(559, n=10, n_probe=4)
+    assert len(similar) == 10
+    assert 559 not in set(similar["similar_users"])
+
+
+def test_stale_ann_index_results_are_trimmed_to_n(engine):
+    # An index that cannot return the query itself still yields n results
+    engine.user_ann_index = IVFIndex.build(engine.user_weights[:-5], n_lists=1)
+    try:
+        similar = engine.find_similar_users(559, n=10, n_probe=1)
+    finally:
+        engine.user_ann_index = None
+
+    assert len(similar) == 10
+
+
+def test_stale_anime_neighbour_table_is_dropped(tmp_path):
+    paths = make_engine_artifacts(str(tmp_path))
+    weights_dir = os.path.dirname(paths["anime_weights_path"])
+    anime_weights = np.load(os.path.join(weights_dir, "anime_weights.npy"))
+
+    def save_table(weights):
+        ids, scores = build_neighbour_table(weights, k=16)
+        np.save(os.path.join(weights_dir, "anime_neighbour_ids.npy"), ids)
+        np.save(os.path.join(weights_dir, "anime_neighbour_scores.npy"), scores)
+        with open(os.path.join(weights_dir, "anime_neighbour_meta.json"), "w") as f:
+            json.dump({"weights_fingerprint": weights_fingerprint(weights)}, f)
+
+    # A table over the current weights is served
+    save_table(anime_weights)
+    assert RecommenderEngine(**paths).anime_neighbour_ids is not None
+
+    # A table left behind before the last 2 animes were added is not, the appended
+    # animes are scored with the exact search
+    save_table(anime_weights[:-2])
+    engine = RecommenderEngine(**paths)
+    assert engine.anime_neighbour_ids is None
+
+    closest, _ = engine.get_similar_anime_scores([39, 38], n=5)
+    assert len(closest) == 10
+
+
+def test_watched_encoded_matches_encoded_watched_ids(engine):
+    for code in range(60):
+        user_id = int(engine.user2user_decoded[code])
+        watched_ids = engine.get_watched_animes(user_id)
+
+        np.testing.assert_array_equal(
+            engine.get_watched_encoded(user_id),
+            [engine.anime2anime_encoded[anime_id] for anime_id in watched_ids],
+        )
+
+
+def test_encode_anime_ids_drops_unknown_ids(engine):
+    anime_ids = [1003, 42, 1039, 1003, 99999, 1000]
+
+    np.testing.assert_array_equal(
+        engine.encode_anime_ids(anime_ids),
+        [engine.anime2anime_encoded[anime_id] for anime_id in (1003, 1039, 1003, 1000)],
+    )
+    assert len(engine.encode_anime_ids([])) == 0
@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+
+from utils.result_cache import CacheBackend, InMemoryBackend, RecommendationCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SharedBackend(CacheBackend):
+    """
+    In-process stand-in for a cache shared across replicas (e.g. Redis).
+
+    Several RecommendationCache instances (one per simulated replica) share one instance.
+    Like a networked cache, values are copied in and out and expire after ttl.
+    """
+
+    shared = True
+
+    def __init__(self, ttl=600, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+
+        self._store = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._store.get(repr(key))
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if self.clock() >= expires_at:
+                del self._store[repr(key)]
+                self.evictions += 1
+                return None
+
+            return list(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._store[repr(key)] = (list(value), self.clock() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+
+    def __len__(self):
+        return len(self._store)
+
+
+class Counter:
+    # compute callback counting how often the cache missed
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return list(self.value)
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_in_memory_backend_evicts_least_recently_used():
+    backend = InMemoryBackend(max_size=2)
+    backend.set("a", [1])
+    backend.set("b", [2])
+
+    # Reading a makes b the least recently used entry
+    assert backend.get("a") == [1]
+    backend.set("c", [3])
+
+    assert backend.get("b") is None
+    assert backend.get("a") == [1]
+    assert backend.get("c") == [3]
+    assert backend.evictions == 1
+
+
+def test_in_memory_backend_expires_entries_after_ttl():
+    clock = FakeClock()
+    backend = InMemoryBackend(ttl=10, clock=clock)
+    backend.set("a", [1])
+
+    clock.now = 9.9
+    assert backend.get("a") == [1]
+
+    clock.now = 10
+    assert backend.get("a") is None
+    assert backend.evictions == 1
+    assert len(backend) == 0
+
+
+@pytest.mark.parametrize("backend", [InMemoryBackend(), SharedBackend()])
+def test_results_are_copied_in_and_out(backend):
+    cache = RecommendationCache(backend=backend)
+    compute = Counter(["Naruto", "Bleach"])
+
+    result = cache.get_or_compute((1, 10), "v1", compute)
+    result.append("mutated")
+    cache.get_or_compute((1, 10), "v1", compute).append("mutated again")
+
+    assert cache.get_or_compute((1, 10), "v1", compute) == ["Naruto", "Bleach"]
+    assert compute.calls == 1
+
+
+def test_hits_and_misses_are_counted():
+    cache = RecommendationCache()
+    compute = Counter(["Naruto"])
+
+    for _ in range(3):
+        assert cache.get_or_compute((1, 10), "v1", compute) == ["Naruto"]
+    cache.get_or_compute((2, 10), "v1", compute)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["model_version"] == "v1"
+    assert compute.calls == 2
+
+
+def test_new_model_version_invalidates_results():
+    backend = InMemoryBackend()
+    cache = RecommendationCache(backend=backend)
+    cache.get_or_compute((1, 10), "v1", Counter(["old"]))
+
+    compute = Counter(["new"])
+    assert cache.get_or_compute((1, 10), "v2", compute) == ["new"]
+    assert compute.calls == 1
+
+    # The local backend is cleared, only the result of the new version is left
+    assert len(backend) == 1
+
+
+def test_shared_backend_serves_every_replica():
+    shared = SharedBackend()
+    replica_a = RecommendationCache(backend=shared)
+    replica_b = RecommendationCache(backend=shared)
+
+    replica_a.get_or_compute((1, 10), "v1", Counter(["Naruto"]))
+
+    compute = Counter(["recomputed"])
+    assert replica_b.get_or_compute((1, 10), "v1", compute) == ["Naruto"]
+    assert compute.calls == 0
+    assert replica_b.stats()["hits"] == 1
+
+
+def test_shared_backend_never_serves_another_model_version():
+    shared = SharedBackend()
+    replica_a = RecommendationCache(backend=shared)
+    replica_b = RecommendationCache(backend=shared)
+
+    replica_a.get_or_compute((1, 10), "v1", Counter(["old"]))
+
+    # replica_b already runs the new model, the v1 entry stays but is not served
+    compute = Counter(["new"])
+    assert replica_b.get_or_compute((1, 10), "v2", compute) == ["new"]
+    assert compute.calls == 1
+    assert replica_a.get_or_compute((1, 10), "v1", Counter(["x"])) == ["old"]
+    assert len(shared) == 2
+
+
+def test_shared_backend_expires_entries_after_ttl():
+    clock = FakeClock()
+    cache = RecommendationCache(backend=SharedBackend(ttl=5, clock=clock))
+    cache.get_or_compute((1, 10), "v1", Counter(["old"]))
+
+    clock.now = 5
+    compute = Counter(["new"])
+    assert cache.get_or_compute((1, 10), "v1", compute) == ["new"]
+    assert compute.calls == 1
+
+
+def test_new_model_version_keeps_shared_entries_of_other_replicas():
+    shared = SharedBackend()
+    replica_a = RecommendationCache(backend=shared)
+    replica_b = RecommendationCache(backend=shared)
+
+    replica_a.get_or_compute((1, 10), "v1", Counter(["old"]))
+    replica_b.get_or_compute((1, 10), "v1", Counter(["old"]))
+
+    # replica_b loads the new model, replica_a still serves v1 from the shared cache
+    replica_b.get_or_compute((1, 10), "v2", Counter(["new"]))
+
+    compute = Counter(["recomputed"])
+    assert replica_a.get_or_compute((1, 10), "v1", compute) == ["old"]
+    assert compute.calls == 0
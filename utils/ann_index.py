@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+
+from utils.similarity import dot_scores, top_k, weights_fingerprint
+
+
+class IVFIndex:
+    """
+    Inverted file index over L2-normalized embeddings.
+
+    Spherical k-means splits the embeddings into n_lists clusters. A query only scores the
+    members of its n_probe closest clusters instead of every embedding, so n_probe trades
+    recall for latency (n_probe == n_lists is an exact search).
+
+    The fingerprint of the weights it was built on is saved with it, so an index left
+    behind by an earlier model can be detected and dropped.
+    """
+
+    def __init__(self, centroids, offsets, ids, weights_fingerprint=None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.weights_fingerprint = weights_fingerprint
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @staticmethod
+    def _assign(weights, centroids, block_size=65536):
+        # Closest centroid of every embedding, computed in blocks to bound memory
+        assignments = np.empty(len(weights), dtype=np.int32)
+        for start in range(0, len(weights), block_size):
+            block = weights[start : start + block_size]
+            assignments[start : start + block_size] = np.argmax(
+                np.dot(block, centroids.T), axis=1
+            )
+        return assignments
+
+    @classmethod
+    def build(cls, weights, n_lists=None, n_iter=10, seed=43):
+        weights = np.asarray(weights, dtype=np.float32)
+        n_items = len(weights)
+
+        if not n_lists:
+            n_lists = int(np.sqrt(n_items))
+        n_lists = max(1, min(n_lists, n_items))
+
+        rng = np.random.default_rng(seed)
+        centroids = weights[rng.choice(n_items, n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assignments = cls._assign(weights, centroids)
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, weights)
+
+            # Re-seed empty clusters with random embeddings
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            sums[empty] = weights[rng.choice(n_items, int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        assignments = cls._assign(weights, centroids)
+
+        ids = np.argsort(assignments, kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=offsets[1:])
+
+        return cls(
+            centroids.astype(np.float32), offsets, ids, weights_fingerprint(weights)
+        )
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(index_dir, "offsets.npy"), self.offsets)
+        np.save(os.path.join(index_dir, "ids.npy"), self.ids)
+
+        with open(os.path.join(index_dir, "meta.json"), "w") as meta_file:
+            json.dump({"weights_fingerprint": self.weights_fingerprint}, meta_file)
+
+    @classmethod
+    def load(cls, index_dir, mmap_mode="r"):
+        # Indexes saved before the fingerprint was stored have no meta.json
+        meta = {}
+        meta_path = os.path.join(index_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+
+        return cls(
+            np.load(os.path.join(index_dir, "centroids.npy")),
+            np.load(os.path.join(index_dir, "offsets.npy")),
+            np.load(os.path.join(index_dir, "ids.npy"), mmap_mode=mmap_mode),
+            meta.get("weights_fingerprint"),
+        )
+
+    @staticmethod
+    def exists(index_dir):
+        return all(
+            os.path.exists(os.path.join(index_dir, name))
+            for name in ("centroids.npy", "offsets.npy", "ids.npy")
+        )
+
+    def matches(self, weights):
+        """Whether the index was built on these weights and covers every row of them."""
+
+        return len(self.ids) == len(weights) and (
+            self.weights_fingerprint == weights_fingerprint(weights)
+        )
+
+    def search(self, weights, query, k, n_probe=8):
+        """
+        Return the (ids, scores) of the approximate k nearest embeddings, best first.
+
+        Args:
+            weights: Embedding matrix the index was built on
+            query: A single normalized query vector
+            k: Number of neighbours to return
+            n_probe: Number of closest clusters to scan
+        """
+
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = max(1, min(n_probe, self.n_lists))
+        lists = top_k(np.dot(self.centroids, query), n_probe)
+
+        candidates = np.concatenate(
+            [self.ids[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+        )
+        scores = np.dot(np.asarray(weights[candidates], dtype=np.float32), query)
+
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+def recall_at_k(index, weights, queries, k=10, n_probe=8):
+    """Mean fraction of the exact top-k neighbours the index returns for the given queries."""
+
+    hits = 0
+    for query in queries:
+        exact = top_k(dot_scores(weights, weights[query]), k)
+        approx, _ = index.search(weights, weights[query], k, n_probe=n_probe)
+        hits += len(np.intersect1d(exact, approx))
+
+    return hits / (k * len(queries))
@@ -0,0 +1,67 @@
+import json
+import os
+
+import numpy as np
+
+
+def save_arrays(arrays, manifest_path, metadata=None):
+    """
+    Save typed arrays as .npy files and describe them in a json manifest.
+
+    Args:
+        arrays: Mapping of artifact name -> (npy path, array), a None array records a file
+            that is already written (e.g. filled through np.lib.format.open_memmap)
+        manifest_path: Where to write the manifest, array files are stored relative to it
+        metadata: Extra json serializable values stored alongside the arrays
+    """
+
+    manifest_dir = os.path.dirname(manifest_path)
+    manifest = {"arrays": {}, "metadata": metadata or {}}
+
+    for name, (path, array) in arrays.items():
+        if array is None:
+            array = np.load(path, mmap_mode="r")
+        else:
+            array = np.ascontiguousarray(array)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, array)
+
+        manifest["arrays"][name] = {
+            "file": os.path.relpath(path, manifest_dir),
+            "dtype": str(array.dtype),
+            "shape": list(array.shape),
+        }
+
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def load_arrays(manifest_path, names=None, mmap_mode="r"):
+    """
+    Open the arrays listed in a manifest, memory-mapped (zero-copy) by default.
+
+    Args:
+        manifest_path: Manifest written by save_arrays
+        names: Artifact names to open, all of them when None
+        mmap_mode: np.load mmap mode, None reads the arrays into memory
+    """
+
+    manifest = read_manifest(manifest_path)
+    manifest_dir = os.path.dirname(manifest_path)
+
+    if names is None:
+        names = list(manifest["arrays"])
+
+    return {
+        name: np.load(
+            os.path.join(manifest_dir, manifest["arrays"][name]["file"]),
+            mmap_mode=mmap_mode,
+        )
+        for name in names
+    }
@@ -0,0 +1,82 @@
+import numpy as np
+
+from utils.similarity import top_k
+
+
+class ScoreSignal:
+    """
+    One source of recommendation scores over the encoded item space.
+
+    Args:
+        scores: Scores of the items in indices, or a dense (n_items,) array when indices is None
+        indices: Encoded items the scores belong to, repeated items add up
+        weight: Weight of the signal in the fused score
+        normalize: "max" divides by the largest score, "minmax" rescales the scored items
+            to [0, 1], "none" keeps the raw scores
+    """
+
+    def __init__(self, scores, indices=None, weight=1.0, normalize="max"):
+        self.scores = scores
+        self.indices = indices
+        self.weight = weight
+        self.normalize = normalize
+
+    def dense(self, n_items):
+        """Return the normalized (n_items,) scores and the mask of items with a score."""
+
+        scores = np.asarray(self.scores, dtype=np.float32).ravel()
+
+        if self.indices is None:
+            dense = scores.copy()
+            present = np.ones(n_items, dtype=bool)
+        else:
+            indices = np.asarray(self.indices).ravel()
+            dense = np.bincount(indices, weights=scores, minlength=n_items)
+            dense = dense.astype(np.float32)
+            present = np.bincount(indices, minlength=n_items) > 0
+
+        if not present.any():
+            return dense, present
+
+        if self.normalize == "max":
+            largest = np.abs(dense[present]).max()
+            if largest > 0:
+                dense /= largest
+        elif self.normalize == "minmax":
+            low, high = dense[present].min(), dense[present].max()
+            dense[present] = (dense[present] - low) / (high - low) if high > low else 1
+
+        return dense, present
+
+
+def fuse_scores(signals, n_items, k, exclude=None):
+    """
+    Weighted sum of score signals over the encoded item space and its top k.
+
+    Only items scored by at least one signal can be returned, excluded items never are.
+
+    Args:
+        signals: ScoreSignal sources, any number of them
+        n_items: Size of the encoded item space
+        k: Number of items to return
+        exclude: Encoded items that must never be returned (e.g. already watched)
+
+    Returns:
+        The encoded items, best first, and their fused scores
+    """
+
+    fused = np.zeros(n_items, dtype=np.float32)
+    candidates = np.zeros(n_items, dtype=bool)
+
+    for signal in signals:
+        dense, present = signal.dense(n_items)
+        fused += signal.weight * dense
+        candidates |= present
+
+    if exclude is not None:
+        candidates[np.asarray(exclude, dtype=np.int64)] = False
+
+    fused[~candidates] = -np.inf
+    best = top_k(fused, min(k, int(candidates.sum())))
+
+    return best, fused[best]
@@ -0,0 +1,89 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+class IdEncoder:
+    """
+    Compact id <-> code encoder backed by arrays.
+
+    ids[code] decodes a code, and a sorted copy of the ids is binary searched to encode ids.
+    Codes are assigned in order of first appearance, the same order as Series.unique().
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids)
+        self._order = np.argsort(self.ids, kind="stable").astype(np.int32)
+        self._sorted_ids = self.ids[self._order]
+
+        # Read-only dict-like views matching the previous {id: code} / {code: id} artifacts
+        self.encoded = _EncodedView(self)
+        self.decoded = _DecodedView(self)
+
+    @classmethod
+    def fit(cls, values):
+        """Return the encoder for values and the int32 codes of values."""
+
+        codes, ids = pd.factorize(np.asarray(values))
+        return cls(ids), codes.astype(np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, values, missing=-1):
+        """Codes of the given ids, unknown ids get the missing code."""
+
+        values = np.asarray(values)
+        positions = np.searchsorted(self._sorted_ids, values)
+        positions = np.minimum(positions, len(self._sorted_ids) - 1)
+
+        found = self._sorted_ids[positions] == values
+        return np.where(found, self._order[positions], missing).astype(np.int32)
+
+    def decode(self, codes):
+        return self.ids[np.asarray(codes)]
+
+    def save(self, path):
+        np.save(path, self.ids)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path))
+
+
+class _EncodedView(Mapping):
+    def __init__(self, encoder):
+        self._encoder = encoder
+
+    def __getitem__(self, key):
+        try:
+            code = self._encoder.encode([key])[0]
+        except (TypeError, ValueError):
+            code = -1
+
+        if code < 0:
+            raise KeyError(key)
+        return int(code)
+
+    def __iter__(self):
+        return iter(self._encoder.ids.tolist())
+
+    def __len__(self):
+        return len(self._encoder)
+
+
+class _DecodedView(Mapping):
+    def __init__(self, encoder):
+        self._encoder = encoder
+
+    def __getitem__(self, code):
+        if not isinstance(code, (int, np.integer)) or not 0 <= code < len(self):
+            raise KeyError(code)
+        return self._encoder.ids[code].item()
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self):
+        return len(self._encoder)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+
+def _row_positions(values):
+    # key -> row positions holding that key, in frame order (missing keys are skipped)
+    return pd.Series(np.arange(len(values))).groupby(values).indices
+
+
+class AnimeMetadataStore:
+    """
+    Anime and synopsis metadata keyed by anime id and by name.
+
+    Lookups go through dict -> row position maps and column arrays built once,
+    instead of a boolean mask over the whole frame on every call.
+    """
+
+    def __init__(self, anime_df, synopsis_df):
+        self.anime_df = anime_df
+        self.synopsis_df = synopsis_df
+
+        # Column arrays of anime_df
+        self.anime_id = anime_df["anime_id"].to_numpy()
+        self.eng_version = anime_df["eng_version"].to_numpy()
+        self.genres = anime_df["Genres"].to_numpy()
+        self.synopsis = synopsis_df["sypnopsis"].to_numpy()
+
+        self.rows_by_id = _row_positions(anime_df["anime_id"].to_numpy())
+        self.rows_by_name = _row_positions(anime_df["eng_version"].to_numpy())
+        self.synopsis_rows_by_id = _row_positions(synopsis_df["MAL_ID"].to_numpy())
+        self.synopsis_rows_by_name = _row_positions(synopsis_df["Name"].to_numpy())
+
+    @staticmethod
+    def _is_id(anime):
+        return isinstance(anime, (int, np.integer))
+
+    def rows(self, anime):
+        """Row positions in anime_df of an anime id or name, empty when unknown."""
+
+        if self._is_id(anime):
+            return self.rows_by_id.get(anime, np.empty(0, dtype=np.int64))
+
+        if isinstance(anime, str):
+            return self.rows_by_name.get(anime, np.empty(0, dtype=np.int64))
+
+    def row(self, anime):
+        """First row position in anime_df of an anime id or name."""
+
+        rows = self.rows(anime)
+        if rows is None or len(rows) == 0:
+            raise IndexError(f"Anime not found: {anime}")
+
+        return rows[0]
+
+    def frame(self, anime):
+        """Rows of anime_df for an anime id or name, same as a boolean mask over the frame."""
+
+        rows = self.rows(anime)
+        if rows is None:
+            return None
+
+        return self.anime_df.iloc[rows]
+
+    def rows_for_ids(self, anime_ids):
+        """Sorted row positions in anime_df of every known id in anime_ids."""
+
+        rows = [self.rows_by_id[i] for i in anime_ids if i in self.rows_by_id]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+
+        return np.unique(np.concatenate(rows))
+
+    def get_synopsis(self, anime):
+        if self._is_id(anime):
+            rows = self.synopsis_rows_by_id.get(anime)
+        elif isinstance(anime, str):
+            rows = self.synopsis_rows_by_name.get(anime)
+        else:
+            return None
+
+        if rows is None:
+            raise IndexError(f"Synopsis not found: {anime}")
+
+        return self.synopsis[rows[0]]
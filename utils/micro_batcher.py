@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collect items submitted concurrently and process them together with one batch_fn call.
+
+    A worker thread waits for a first item, then keeps collecting for up to window_ms or
+    until max_batch_size items are queued, and calls batch_fn(items). batch_fn returns one
+    result per item, in order, which resolve the futures returned by submit. When it
+    raises or returns the wrong number of results, every future of the batch fails.
+    """
+
+    def __init__(self, batch_fn, window_ms=5, max_batch_size=64):
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            if entry is _STOP:
+                # Stop once the collected items are processed
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = self._collect(first)
+            futures = [future for _, future in batch]
+
+            try:
+                results = list(self.batch_fn([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise ValueError(
+                        f"batch_fn returned {len(results)} results for "
+                        f"{len(batch)} items"
+                    )
+
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                # No future is left unresolved, its caller would wait forever
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+def concat_ranges(starts, lengths):
+    """Concatenation of range(start, start + length) for every (start, length), vectorized."""
+
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(
+        starts - ends + lengths, lengths
+    )
+
+
+class RatingIndex:
+    """
+    CSR style index over the processed ratings.
+
+    Rows are grouped by encoded user so that the ratings of user u live in
+    anime[offsets[u]:offsets[u + 1]] and rating[offsets[u]:offsets[u + 1]],
+    turning a per-user lookup into an O(k) slice instead of a full table scan.
+    """
+
+    def __init__(self, offsets, anime, rating):
+        self.offsets = offsets
+        self.anime = anime
+        self.rating = rating
+
+    @classmethod
+    def build(cls, users, animes, ratings, n_users):
+        users = np.asarray(users)
+
+        # Stable sort keeps the original row order inside each user's slice
+        order = np.argsort(users, kind="stable")
+
+        counts = np.bincount(users, minlength=n_users)
+        offsets = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        anime = np.asarray(animes)[order].astype(np.int32, copy=False)
+        rating = np.asarray(ratings)[order].astype(np.float32, copy=False)
+
+        return cls(offsets, anime, rating)
+
+    def save(self, offsets_path, anime_path, rating_path):
+        np.save(offsets_path, self.offsets)
+        np.save(anime_path, self.anime)
+        np.save(rating_path, self.rating)
+
+    @classmethod
+    def load(cls, offsets_path, anime_path, rating_path, mmap_mode="r"):
+        return cls(
+            np.load(offsets_path, mmap_mode=mmap_mode),
+            np.load(anime_path, mmap_mode=mmap_mode),
+            np.load(rating_path, mmap_mode=mmap_mode),
+        )
+
+    @property
+    def n_users(self):
+        return len(self.offsets) - 1
+
+    def user_ratings(self, user):
+        """Return the (encoded anime, rating) arrays of an encoded user."""
+
+        start, end = self.offsets[user], self.offsets[user + 1]
+        return self.anime[start:end], self.rating[start:end]
+
+    def top_items(self, user, percentile=75):
+        """Return the encoded animes a user rated at or above their given percentile."""
+
+        anime, rating = self.user_ratings(user)
+        if len(rating) == 0:
+            return anime
+
+        threshold = np.percentile(rating, percentile)
+        return anime[rating >= threshold]
+
+    def top_items_many(self, users, percentile=75):
+        """
+        top_items of several encoded users in one grouped pass over their slices.
+
+        The ratings are sorted inside each user's segment and the percentile is read at its
+        sorted position. The interpolated np.percentile value lies strictly between two
+        neighbouring sorted ratings unless it falls on one, so "rating >= percentile" keeps
+        the same ratings as "rating >= the rating at the rounded-up position".
+
+        Returns:
+            The segment (position in users) and encoded anime of every kept rating, grouped
+            by segment in the order of users and in slice order inside a segment
+        """
+
+        users = np.asarray(users, dtype=np.int64)
+        starts = self.offsets[users]
+        lengths = self.offsets[users + 1] - starts
+
+        positions = concat_ranges(starts, lengths)
+        segments = np.repeat(np.arange(len(users)), lengths)
+        rating = self.rating[positions]
+
+        # Sorted ratings of every segment, segments kept in order
+        sorted_rating = rating[np.lexsort((rating, segments))]
+
+        segment_starts = np.cumsum(lengths) - lengths
+        cutoff_positions = segment_starts + np.ceil(
+            percentile / 100 * np.maximum(lengths - 1, 0)
+        ).astype(np.int64)
+
+        cutoffs = np.zeros(len(users), dtype=rating.dtype)
+        non_empty = lengths > 0
+        cutoffs[non_empty] = sorted_rating[cutoff_positions[non_empty]]
+
+        keep = rating >= cutoffs[segments]
+        return segments[keep], self.anime[positions[keep]]
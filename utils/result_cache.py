@@ -0,0 +1,134 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class CacheBackend(ABC):
+    """
+    Storage interface of RecommendationCache.
+
+    The default InMemoryBackend is local to the process. A backend shared by every replica
+    (e.g. Redis or memcached) implements the same three methods and sets shared, so one
+    replica loading a new model does not clear the entries the others still serve.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def get(self, key):
+        """Cached value of key, None on a miss."""
+
+    @abstractmethod
+    def set(self, key, value):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class InMemoryBackend(CacheBackend):
+    """
+    Thread-safe LRU cache of at most max_size entries, each expiring ttl seconds after set.
+
+    Values are copied in and out, so callers mutating a result never change the cache.
+    """
+
+    def __init__(self, max_size=10000, ttl=600, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if self.clock() >= expires_at:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return list(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (list(value), self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RecommendationCache:
+    """
+    Bounded cache of recommendation results in front of the prediction pipeline.
+
+    Keys include the model version, so results of a previous model are never served. When
+    the engine loads a new model version, the local backend is also cleared to free it.
+    """
+
+    def __init__(self, backend=None, max_size=10000, ttl=600):
+        if backend is None:
+            backend = InMemoryBackend(max_size=max_size, ttl=ttl)
+        self.backend = backend
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, model_version, compute):
+        """
+        Cached result of key for model_version, computed and stored on a miss.
+
+        Args:
+            key: Hashable request parameters, e.g. (user_id, weights, n)
+            model_version: Version of the loaded model artifacts
+            compute: Called without arguments to compute the result on a miss
+        """
+
+        with self._lock:
+            if model_version != self.model_version:
+                if self.model_version is not None and not self.backend.shared:
+                    self.backend.clear()
+                self.model_version = model_version
+
+        versioned_key = (model_version,) + tuple(key)
+        value = self.backend.get(versioned_key)
+
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+
+        value = compute()
+        self.backend.set(versioned_key, value)
+        return value
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "model_version": self.model_version,
+        }
@@ -0,0 +1,113 @@
+import hashlib
+
+import numpy as np
+
+
+def top_k(scores, k, neg=False):
+    """
+    Return the indices of the k best scores, best first.
+
+    Uses argpartition to select the k candidates in O(N) and only sorts those,
+    instead of fully sorting every score with argsort.
+
+    Args:
+        scores: 1-D array of scores, or 2-D array with one row per query
+        k: Number of indices to return per query
+        neg: Whether to return the lowest scores instead of the highest
+    """
+
+    scores = np.asarray(scores)
+    single = scores.ndim == 1
+    scores = np.atleast_2d(scores)
+
+    # Always select the smallest keys, so flip the sign for the highest scores
+    keys = scores if neg else -scores
+
+    n_items = keys.shape[1]
+    k = min(k, n_items)
+
+    if k < n_items:
+        candidates = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_items), keys.shape)
+
+    candidate_keys = np.take_along_axis(keys, candidates, axis=1)
+    order = np.argsort(candidate_keys, axis=1, kind="stable")
+    indices = np.take_along_axis(candidates, order, axis=1)
+
+    return indices[0] if single else indices
+
+
+def dot_scores(weights, queries, block_size=65536):
+    """
+    Similarity of every weight row to the query (1-D) or to every query row (2-D).
+
+    float32 weights are used as is. Lower precision weights (e.g. memory-mapped float16)
+    are upcast to float32 one block of rows at a time, so BLAS is used without ever
+    materializing a float32 copy of the whole matrix.
+
+    Returns:
+        An (n_items,) array for a single query, otherwise (n_queries, n_items)
+    """
+
+    queries = np.asarray(queries, dtype=np.float32)
+    single = queries.ndim == 1
+
+    if weights.dtype == np.float32:
+        return np.dot(weights, queries) if single else np.dot(queries, weights.T)
+
+    queries = np.atleast_2d(queries)
+    scores = np.empty((len(queries), len(weights)), dtype=np.float32)
+
+    for start in range(0, len(weights), block_size):
+        block = np.asarray(weights[start : start + block_size], dtype=np.float32)
+        scores[:, start : start + block_size] = np.dot(queries, block.T)
+
+    return scores[0] if single else scores
+
+
+def build_neighbour_table(weights, k, block_size=1024):
+    """
+    Precompute the k best neighbours (best first, including the item itself) of every row.
+
+    Rows are scored in blocks of block_size against all weights, so peak memory is
+    block_size * n_items scores instead of a full n_items * n_items similarity matrix.
+
+    Returns:
+        An int32 (n_items, k) array of neighbour indices and the float16 scores alongside it
+    """
+
+    weights = np.asarray(weights, dtype=np.float32)
+    n_items = len(weights)
+    k = min(k, n_items)
+
+    ids = np.empty((n_items, k), dtype=np.int32)
+    scores = np.empty((n_items, k), dtype=np.float16)
+
+    for start in range(0, n_items, block_size):
+        block_dists = dot_scores(weights, weights[start : start + block_size])
+        block_ids = top_k(block_dists, k)
+
+        ids[start : start + block_size] = block_ids
+        scores[start : start + block_size] = np.take_along_axis(
+            block_dists, block_ids, axis=1
+        )
+
+    return ids, scores
+
+
+def weights_fingerprint(weights, n_rows=256):
+    """
+    Short hash of the shape and a sample of rows of an embedding matrix.
+
+    Artifacts derived from the weights (ANN indexes, neighbour table) store it, so stale
+    ones can be told apart from the loaded weights. Rows are hashed as float16, so the
+    float32 and float16 copies of the same weights share a fingerprint.
+    """
+
+    rows = np.unique(np.linspace(0, len(weights) - 1, n_rows).astype(np.int64))
+    sample = np.asarray(weights[rows], dtype=np.float16) if len(weights) else b""
+
+    digest = hashlib.md5(repr(tuple(weights.shape)).encode())
+    digest.update(np.ascontiguousarray(sample).tobytes())
+    return digest.hexdigest()[:12]